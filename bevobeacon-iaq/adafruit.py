@@ -1,14 +1,14 @@
 """Adafruit Sensors
 
 This script handles data measurements from the Adafruit SGP30 and TSL2591 sensors.
+Both share the handle of the I2C bus and make their transactions through it.
 """
 import asyncio
 import time
-import numpy as np
+import math
 
-# Raspberry PI board libraries
-from board import SCL, SDA
-from busio import I2C
+from i2c_bus import I2CBus
+from sensor_specs import SENSORS, TIMING
 
 # Sensor libraries
 import adafruit_sgp30
@@ -18,56 +18,68 @@ import adafruit_tsl2591
 class SGP30:
     """Located within SVM30"""
 
-    def __init__(self) -> None:
-        i2c = I2C(SCL, SDA)
-        sgp30 = adafruit_sgp30.Adafruit_SGP30(i2c)
-        sgp30.iaq_init()
+    bus, columns = SENSORS["sgp"]
+    warmup, sample_interval = TIMING["sgp"]
+
+    def __init__(self, i2c=None) -> None:
+        self.i2c = I2CBus() if i2c is None else i2c
+        sgp30 = self.i2c.transaction("sgp", adafruit_sgp30.Adafruit_SGP30, self.i2c.handle)
+        self.i2c.transaction("sgp", sgp30.iaq_init)
         self.sgp30 = sgp30
 
-    async def scan(self):
+    def read(self):
         try:
-            eCO2, TVOC = self.sgp30.iaq_measure()
+            eCO2, TVOC = self.i2c.transaction("sgp", self.sgp30.iaq_measure)
         except:
-            eCO2 = np.nan
-            TVOC = np.nan
+            eCO2 = math.nan
+            TVOC = math.nan
 
         data = {"total_volatile_organic_compounds-ppb": TVOC, "equivalent_carbon_dioxide-ppm": eCO2}
         return data
 
+    async def scan(self):
+        return self.read()
+
 
 class TSL2591:
-    def __init__(self) -> None:
-        i2c = I2C(SCL, SDA)
-        tsl = adafruit_tsl2591.TSL2591(i2c)
+    bus, columns = SENSORS["tsl"]
+    warmup, sample_interval = TIMING["tsl"]
+
+    def __init__(self, i2c=None) -> None:
+        self.i2c = I2CBus() if i2c is None else i2c
+        tsl = self.i2c.transaction("tsl", adafruit_tsl2591.TSL2591, self.i2c.handle)
 
         # set gain and integration time; gain 0 = 1x & 1 = 16x. Integration time of 1 = 101ms
-        tsl.gain = 0
-        tsl.integration_time = 1  # 101 ms intergration time.
+        self.i2c.batch("tsl", lambda: setattr(tsl, "gain", 0), lambda: setattr(tsl, "integration_time", 1))
 
         self.tsl = tsl
 
     def enable(self):
-        self.tsl.enabled = True
+        self.i2c.transaction("tsl", setattr, self.tsl, "enabled", True)
 
     def disable(self):
-        self.tsl.enabled = False
+        self.i2c.transaction("tsl", setattr, self.tsl, "enabled", False)
 
-    async def scan(self):
+    def read(self):
         try:
             tsl = self.tsl
 
-            # Retrieve sensor scan data
-            lux = tsl.lux
-            visible = tsl.visible
-            infrared = tsl.infrared
+            # Retrieve sensor scan data - the visible and infrared light are worked
+            # out from one read of both channels instead of reading them again
+            lux, (channel_0, channel_1) = self.i2c.batch("tsl", lambda: tsl.lux, lambda: tsl.raw_luminosity)
+            visible = ((channel_1 << 16) | channel_0) - channel_1
+            infrared = channel_1
 
             # Check for complete darkness
             if lux == None:
                 lux = 0
         except:
-            lux = np.nan
-            visible = np.nan
-            infrared = np.nan
+            lux = math.nan
+            visible = math.nan
+            infrared = math.nan
 
         data = {"visible-unitless": visible, "infrared-unitless": infrared, "light-lux": lux}
-        return data
\ No newline at end of file
+        return data
+
+    async def scan(self):
+        return self.read()
@@ -0,0 +1,90 @@
+"""Cycle Aggregator
+
+This script averages the repeated sensor samples taken during a scan cycle into a
+single row of measurements. The column order is fixed when the aggregator is
+created and the running sums/counts live in preallocated arrays, so a cycle does
+not allocate a DataFrame per sensor.
+"""
+import math
+from array import array
+
+
+class CycleAggregator:
+
+    def __init__(self, columns) -> None:
+        """
+        Parameters
+        ----------
+        columns : iterable of str
+            names of every measurement that can be reported in a cycle
+
+        Creates
+        -------
+        columns : list of str
+            measurement names in the order they are written (alphabetical)
+        index : dict
+            position of each measurement within a row
+        sums : array
+            running sum of the valid samples for each measurement
+        counts : array
+            number of valid samples for each measurement
+        """
+        self.columns = sorted(set(columns))
+        self.index = {column: i for i, column in enumerate(self.columns)}
+
+        self._zeros = array("d", bytes(8 * len(self.columns)))
+        self.sums = array("d", self._zeros)
+        self.counts = array("d", self._zeros)
+
+    def reset(self):
+        """Clears the running sums and counts in place"""
+        self.sums[:] = self._zeros
+        self.counts[:] = self._zeros
+
+    def add(self, sample):
+        """
+        Adds one sample to the running sums - NaN and missing values are skipped
+
+        Parameters
+        ----------
+        sample : dict
+            measurements indexed by column name
+        """
+        index = self.index
+        sums = self.sums
+        counts = self.counts
+        for column, value in sample.items():
+            i = index.get(column)
+            if i is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if value == value:
+                sums[i] += value
+                counts[i] += 1
+
+    def add_readings(self, readings):
+        """
+        Adds the samples from every sensor
+
+        Parameters
+        ----------
+        readings : dict of list
+            samples from each sensor indexed by sensor name
+        """
+        for samples in readings.values():
+            for sample in samples:
+                self.add(sample)
+
+    def means(self):
+        """
+        Gets the NaN-aware mean of each measurement
+
+        Returns
+        -------
+        row : list of float
+            means in column order, NaN where no valid sample was taken
+        """
+        return [s / c if c else math.nan for s, c in zip(self.sums, self.counts)]
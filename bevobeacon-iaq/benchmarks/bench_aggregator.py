@@ -0,0 +1,77 @@
+"""Benchmark - Cycle Aggregator
+
+Compares building a cycle's row with pandas (a DataFrame per sensor, mean, concat
+and transpose) against the array-backed CycleAggregator. Reports the time per
+cycle and the peak memory allocated while building a row.
+
+Usage: python3 benchmarks/bench_aggregator.py [cycles]
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aggregate import CycleAggregator
+
+COLUMNS = {
+    "sgp": ["total_volatile_organic_compounds-ppb", "equivalent_carbon_dioxide-ppm"],
+    "tsl": ["visible-unitless", "infrared-unitless", "light-lux"],
+    "sps": ["pm0p5_count-number_per_cm3", "pm1_count-number_per_cm3", "pm2p5_count-number_per_cm3",
+            "pm4_count-number_per_cm3", "pm10_count-number_per_cm3", "pm1_mass-microgram_per_m3",
+            "pm2p5_mass-microgram_per_m3", "pm4_mass-microgram_per_m3", "pm10_mass-microgram_per_m3"],
+    "scd": ["carbon_dioxide-ppm", "t_from_co2-c", "rh_from_co2-percent"],
+    "dgs_co": ["carbon_monoxide-ppb", "t_from_co-c", "rh_from_co-percent"],
+    "dgs_no2": ["nitrogen_dioxide-ppb", "t_from_no2-c", "rh_from_no2-percent"],
+}
+
+
+def make_readings(samples=5):
+    return {
+        name: [{column: random.uniform(0, 1000) for column in columns} for _ in range(samples)]
+        for name, columns in COLUMNS.items()
+    }
+
+
+def pandas_row(readings, timestamp):
+    import pandas as pd
+    data = {name: pd.DataFrame(samples).mean() for name, samples in readings.items()}
+    df = pd.concat([pd.Series({"Timestamp": timestamp}), *data.values()]).to_frame().T.set_index("Timestamp")
+    df.sort_index(axis=1, inplace=True)
+    return df
+
+
+def aggregator_row(aggregator, readings, timestamp):
+    aggregator.reset()
+    aggregator.add_readings(readings)
+    return [timestamp, *aggregator.means()]
+
+
+def measure(fxn, cycles):
+    fxn()  # warm up imports and caches
+    start_time = time.perf_counter()
+    for _ in range(cycles):
+        fxn()
+    elapsed = (time.perf_counter() - start_time) / cycles
+
+    tracemalloc.start()
+    fxn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    readings = make_readings()
+    timestamp = "2021-01-01 00:00:00"
+    aggregator = CycleAggregator(column for columns in COLUMNS.values() for column in columns)
+
+    for label, fxn in [
+        ("pandas", lambda: pandas_row(readings, timestamp)),
+        ("aggregator", lambda: aggregator_row(aggregator, readings, timestamp)),
+    ]:
+        elapsed, peak = measure(fxn, cycles)
+        print(f"{label:12s} {elapsed * 1e6:10.1f} us/cycle {peak / 1024:8.1f} KiB peak")
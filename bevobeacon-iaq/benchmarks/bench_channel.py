@@ -0,0 +1,59 @@
+"""Benchmark - Latest Reading Channel
+
+Starts a publisher process that replaces the shared row as fast as it can while
+this process reads it, then reports the read latency and checks that no torn
+(half-written) row was ever returned.
+
+Usage: python3 benchmarks/bench_channel.py [seconds]
+"""
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from channel import LatestReadingPublisher, LatestReadingSubscriber
+
+COLUMNS = [f"measurement_{i}-unit" for i in range(30)]
+
+
+def publish(path, seconds):
+    publisher = LatestReadingPublisher(path)
+    stop = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < stop:
+        # every value in a row is the same so a torn read is easy to spot
+        publisher.publish("00", {"Timestamp": str(i), **{column: float(i) for column in COLUMNS}})
+        i += 1
+    publisher.close()
+    print(f"published: {i} rows")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    path = os.path.join(tempfile.gettempdir(), f"bevobeacon-bench-{os.getpid()}")
+    LatestReadingPublisher(path).close()
+
+    process = multiprocessing.Process(target=publish, args=(path, seconds))
+    process.start()
+
+    subscriber = LatestReadingSubscriber(path)
+    reads = misses = torn = 0
+    elapsed = 0
+    while process.is_alive():
+        start_time = time.perf_counter()
+        latest = subscriber.read()
+        elapsed += time.perf_counter() - start_time
+        reads += 1
+        if latest is None:
+            misses += 1
+        elif len({value for column, value in latest[1].items() if column != "Timestamp"}) > 1:
+            torn += 1
+    process.join()
+    subscriber.close()
+    os.remove(path)
+
+    print(f"reads: {reads} ({misses} empty), torn rows: {torn}")
+    print(f"read latency: {elapsed / reads * 1e6:.1f} us")
@@ -0,0 +1,63 @@
+"""Benchmark - Upload Compression
+
+Writes a synthetic day of one-minute rows and compresses it with each of the
+codecs the UploadQueue can use. Reports the compression ratio, the CPU seconds
+spent per day-file, and the peak memory allocated by Python while compressing
+(which does not grow with the file because it is streamed rather than read all
+at once - lzma's peak is mostly its dictionary, lower presets use less).
+
+Usage: python3 benchmarks/bench_codecs.py [rows]
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import DailyCsvWriter
+from upload import CODECS, compress_file, zstandard
+
+COLUMNS = [f"measurement_{i}-unit" for i in range(30)]
+
+
+def write_day(data_dir, n):
+    writer = DailyCsvWriter("00", COLUMNS, data_dir=data_dir, flush_rows=None)
+    start = datetime.datetime(2021, 1, 1)
+    for minute in range(n):
+        writer.write(start + datetime.timedelta(minutes=minute), [round(random.uniform(0, 1000), 1) for _ in COLUMNS])
+    path = writer.path
+    writer.close()
+    return path
+
+
+def measure(path, codec):
+    tracemalloc.start()
+    start_time = time.process_time()
+    compressed = compress_file(path, codec)
+    cpu = time.process_time() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = os.path.getsize(compressed)
+    os.remove(compressed)
+    return size, cpu, peak
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1440
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = write_day(data_dir, n)
+        size = os.path.getsize(path)
+        print(f"day file: {size / 1024:.1f} KiB ({n} rows)")
+        print(f"{'codec':<6} {'KiB':>8} {'ratio':>6} {'CPU s':>7} {'peak KiB':>9}")
+        for codec in CODECS:
+            if codec == "zstd" and zstandard is None:
+                print(f"{codec:<6} skipped - zstandard is not installed")
+                continue
+            compressed, cpu, peak = measure(path, codec)
+            print(f"{codec:<6} {compressed / 1024:8.1f} {size / compressed:6.2f} {cpu:7.3f} {peak / 1024:9.1f}")
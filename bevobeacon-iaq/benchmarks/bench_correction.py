@@ -0,0 +1,56 @@
+"""Benchmark - Batched Correction
+
+Corrects a synthetic archive of one-minute data from many beacons, comparing the
+parameter-by-parameter correction of each beacon's data (as Calculate did before)
+against one batched correction over the whole data matrix with a beacon column.
+
+Usage: python3 benchmarks/bench_correction.py [--days 365] [--beacons 50]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from calibration import CorrectionRegistry
+
+PARAMS = ["co2", "pm2p5_mass", "co", "temperature_c", "rh"]
+
+
+def per_parameter(corrections, values, beacons):
+    import pandas as pd
+    df = pd.DataFrame(values, columns=PARAMS)
+    df["beacon"] = beacons
+    results = []
+    for beacon, data in df.groupby("beacon"):
+        data = data.copy()
+        for param in PARAMS:
+            data[param] = corrections.apply(param, data[param], beacon)
+        results.append(data)
+    return pd.concat(results)
+
+
+def batched(corrections, values, beacons):
+    return corrections.apply_many(PARAMS, values, beacons)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", default=365, type=int, help="days of one-minute data per beacon")
+    parser.add_argument("--beacons", default=50, type=int, help="number of beacons")
+    args = parser.parse_args()
+
+    rows = args.days * 1440
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 1000, size=(rows * args.beacons, len(PARAMS)))
+    beacons = np.repeat(np.arange(1, args.beacons + 1), rows)
+    print(f"{len(values):,} rows x {len(PARAMS)} parameters ({values.nbytes / 2**20:.0f} MiB)")
+
+    corrections = CorrectionRegistry()
+    for label, fxn in [("per parameter", per_parameter), ("batched", batched)]:
+        start_time = time.perf_counter()
+        fxn(corrections, values, beacons)
+        print(f"{label:15s} {time.perf_counter() - start_time:8.2f} s")
@@ -0,0 +1,143 @@
+"""Benchmark - DGS Serial Connection
+
+Measures the latency of single DGS samples when the serial port is reopened for
+every measurement, kept open, kept open with pipelined requests, read from the
+event loop, and streamed continuously. Samples are taken through the driver's
+async ``scan`` while a heartbeat task measures how long the event loop is held
+up. A thread on the other end of a pseudo-terminal stands in for the sensor: it
+answers every request with a measurement after a short delay, or sends records
+at a fixed interval once the continuous output is started. Halfway through, the sensor is
+"unplugged" and plugged back in on a new pseudo-terminal to check that the
+persistent connections recover.
+
+Usage: python3 benchmarks/bench_dgs_serial.py [samples] [response time] [gap]
+"""
+import os
+import sys
+import pty
+import time
+import select
+import asyncio
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from spec_dgs import DGS_NO2, CONNECTIONS
+
+
+class FakeSensor:
+
+    def __init__(self, link, response_time=0.05, stream_interval=0.1) -> None:
+        """
+        Answers measurement requests on a pseudo-terminal reached through a symlink
+
+        Parameters
+        ----------
+        link : str
+            location of the symlink to the pseudo-terminal, i.e. the sensor's port
+        response_time : float, default 0.05
+            seconds the sensor takes to measure
+        stream_interval : float, default 0.1
+            seconds between records in continuous output - shorter than the real
+            sensor's so the benchmark runs quickly
+        """
+        self.link = link
+        self.response_time = response_time
+        self.stream_interval = stream_interval
+        self.requests = 0
+        self.plug()
+
+    def plug(self):
+        """Creates a new pseudo-terminal and points the port to it"""
+        self.master, self.slave = pty.openpty()
+        if os.path.lexists(self.link):
+            os.remove(self.link)
+        os.symlink(os.ttyname(self.slave), self.link)
+        self.running = True
+        self.streaming = False
+        self.thread = threading.Thread(target=self.serve, args=(self.master,), daemon=True)
+        self.thread.start()
+
+    def unplug(self):
+        self.running = False
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+        os.remove(self.link)
+
+    def replug(self):
+        self.unplug()
+        self.plug()
+
+    def send_record(self, fd):
+        self.requests += 1
+        t = time.localtime()
+        line = f"012345678901, {self.requests}, 24, 45, 30000, 25000, 30000, 00, {t.tm_hour:02d}, {t.tm_min:02d}, {t.tm_sec:02d}\r\n"
+        os.write(fd, line.encode())
+
+    def serve(self, fd):
+        next_record = time.monotonic()
+        while self.running:
+            if self.streaming and time.monotonic() >= next_record:
+                self.send_record(fd)
+                next_record += self.stream_interval
+            if not select.select([fd], [], [], 0.01 if self.streaming else 0.05)[0]:
+                continue
+            commands = os.read(fd, 1024)
+            if b"c" in commands:
+                self.streaming = True
+                next_record = time.monotonic()
+            for _ in range(commands.count(b"\r")):
+                time.sleep(self.response_time)
+                self.send_record(fd)
+
+
+async def heartbeat(lags, interval=0.005):
+    """Records how late the event loop wakes up from short sleeps"""
+    while True:
+        start_time = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start_time - interval)
+
+
+async def run(connection, port, sensor, samples, gap):
+    """Takes the samples, unplugging the sensor halfway, and gets the latency of each"""
+    dgs = DGS_NO2(port, connection=connection)
+    latencies = []
+    lags = []
+    failed = 0
+    task = asyncio.create_task(heartbeat(lags))
+    for i in range(samples):
+        if i == samples // 2:
+            await asyncio.to_thread(sensor.replug)
+        start_time = time.perf_counter()
+        reading = await dgs.scan()
+        latencies.append(time.perf_counter() - start_time)
+        failed += reading["nitrogen_dioxide-ppb"] != reading["nitrogen_dioxide-ppb"]
+        await asyncio.sleep(gap)
+    task.cancel()
+    dgs.close()
+    reconnects = dgs.transport.reconnects if dgs.transport is not None else dgs.reconnects
+    return latencies, failed, reconnects, max(lags, default=0.0)
+
+
+if __name__ == "__main__":
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    response_time = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    gap = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        port = os.path.join(work_dir, "ttyUSB0")
+        for connection in CONNECTIONS:
+            sensor = FakeSensor(port, response_time)
+            latencies, failed, reconnects, lag = asyncio.run(run(connection, port, sensor, samples, gap))
+            sensor.unplug()
+            latencies.sort()
+            print(
+                f"{connection:<10} p50 {latencies[len(latencies) // 2] * 1e3:6.1f} ms  "
+                f"max {latencies[-1] * 1e3:6.1f} ms  failed {failed}/{samples}  reconnects {reconnects}  "
+                f"loop blocked up to {lag * 1e3:6.1f} ms"
+            )
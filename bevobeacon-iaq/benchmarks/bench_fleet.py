@@ -0,0 +1,159 @@
+"""Benchmark - Beacon Fleet
+
+Runs several simulated beacons side by side, each in its own process running the
+main loop on an accelerated clock with simulated sensors, its own temporary data
+directory, and a fake S3 bucket. Reports the cycle time distribution, bytes
+written, CPU seconds, and peak RSS of every beacon, and saves the results as JSON
+for tracking regressions between versions.
+
+Uploads of the day's file and summary are made every half hour rather than once
+a day so they happen within a short run.
+
+Usage: python3 benchmarks/bench_fleet.py [--beacons 4] [--speed 100] [--hours 2] [--report fleet_report.json]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import datetime
+import tempfile
+import resource
+import multiprocessing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+
+def percentile(values, q):
+    """Gets the q-th percentile (0-100) by linear interpolation"""
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+
+
+def written_bytes():
+    """Gets the bytes this process has passed to write calls (Linux only)"""
+    try:
+        with open("/proc/self/io") as f:
+            return int(next(line for line in f if line.startswith("wchar:")).split()[1])
+    except (OSError, StopIteration):
+        return None
+
+
+def run_beacon(beacon, args, work_dir, results):
+    """Runs the main loop of one beacon and puts its measurements on the results queue"""
+    logging.basicConfig(level=logging.ERROR)
+
+    data_dir = os.path.join(work_dir, f"b{beacon}", "DATA")
+    summary_dir = os.path.join(work_dir, f"b{beacon}", "summary_data") + os.sep
+    os.makedirs(data_dir)
+    os.makedirs(summary_dir)
+    os.environ.update({
+        "DATA_DIR": data_dir,
+        "SUMMARY_DIR": summary_dir,
+        "LATEST_READING_PATH": os.path.join(work_dir, f"b{beacon}", "latest"),
+        "METRICS_PATH": os.path.join(work_dir, f"b{beacon}", "metrics.prom"),
+        "SENSOR_BACKEND": "simulated",
+        "SIM_LATENCY": str(args.latency),
+        "SIM_ERROR_RATE": str(args.error_rate),
+        "S3_UPLOAD_MODE": args.upload_mode,
+        "S3_UPLOAD_HOURS": str(args.upload_hours),
+    })
+
+    from main import main
+    from clock import AcceleratedClock
+    from bench_upload import FakeS3
+
+    s3 = FakeS3(latency=0.01, failure_rate=args.failure_rate)
+    os.environ.update({"AWS_ACCESS_KEY_ID": "fleet", "AWS_SECRET_ACCESS_KEY": "fleet", "BUCKET_NAME": "fleet"})
+    clock = AcceleratedClock(args.speed, start=datetime.datetime(2021, 6, 1, 23, 0))
+
+    start_time = time.perf_counter()
+    cycle_times = asyncio.run(main(beacon, clock=clock, s3=s3, max_cycles=int(args.hours * 60)))
+    wall = time.perf_counter() - start_time
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    period = 60 / args.speed
+    results.put({
+        "beacon": beacon,
+        "cycles": len(cycle_times),
+        "wall_seconds": wall,
+        "cycle_seconds": {
+            "p50": percentile(cycle_times, 50),
+            "p95": percentile(cycle_times, 95),
+            "max": max(cycle_times, default=float("nan")),
+        },
+        "overruns": sum(cycle_time > period for cycle_time in cycle_times),
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "peak_rss_kib": usage.ru_maxrss,
+        "written_bytes": written_bytes(),
+        "disk_bytes": directory_size(data_dir) + directory_size(summary_dir),
+        "uploaded_bytes": sum(len(data) for data in s3.objects.values()),
+        "uploaded_objects": len(s3.objects),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--beacons", type=int, default=4, help="number of simulated beacons")
+    parser.add_argument("--speed", type=float, default=100, help="clock seconds per real second")
+    parser.add_argument("--hours", type=float, default=2, help="simulated hours per beacon")
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds each simulated sensor read blocks for")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of simulated sensor reads that fail")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of fake S3 uploads that fail")
+    parser.add_argument("--upload-mode", default="daily", choices=["daily", "incremental"])
+    parser.add_argument(
+        "--upload-hours", type=float, default=0.5,
+        help="simulated hours between uploads of the day's file and summary - a day on the beacons",
+    )
+    parser.add_argument("--report", default="fleet_report.json", help="location of the JSON report")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as work_dir:
+        processes = [
+            context.Process(target=run_beacon, args=(f"{i + 1:02d}", args, work_dir, results))
+            for i in range(args.beacons)
+        ]
+        start_time = time.perf_counter()
+        for process in processes:
+            process.start()
+        beacons = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        wall = time.perf_counter() - start_time
+
+    beacons.sort(key=lambda result: result["beacon"])
+    report = {
+        "settings": vars(args),
+        "python": sys.version.split()[0],
+        "wall_seconds": wall,
+        "cycle_seconds_p95_max": max(result["cycle_seconds"]["p95"] for result in beacons),
+        "overruns": sum(result["overruns"] for result in beacons),
+        "beacons": beacons,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"{'beacon':<7} {'cycles':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'overrun':>7} {'CPU s':>7} {'RSS MiB':>8} {'disk KiB':>9} {'S3 KiB':>8}")
+    for result in beacons:
+        cycle = result["cycle_seconds"]
+        print(
+            f"{result['beacon']:<7} {result['cycles']:>6} {cycle['p50'] * 1e3:8.1f} {cycle['p95'] * 1e3:8.1f} "
+            f"{cycle['max'] * 1e3:8.1f} {result['overruns']:>7} {result['cpu_seconds']:7.2f} "
+            f"{result['peak_rss_kib'] / 1024:8.1f} {result['disk_bytes'] / 1024:9.1f} {result['uploaded_bytes'] / 1024:8.1f}"
+        )
+    print(f"{args.beacons} beacons x {args.hours} h at {args.speed:g}x in {wall:.1f} s - report saved to {args.report}")
@@ -0,0 +1,77 @@
+"""Benchmark - Recent History
+
+Compares getting the 5 minute, 1 hour and 24 hour means, minimums and maximums
+from the in-memory history, which updates them as each row is added, against
+reading the last day's data file again and calculating them from the rows.
+Reports the time per cycle of each and the memory held by the history.
+
+Usage: python3 benchmarks/bench_history.py [cycles]
+"""
+import os
+import sys
+import math
+import time
+import random
+import datetime
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from hal import SENSORS, SIGNALS
+from history import History, WINDOWS
+from storage import DailyCsvWriter, read_rows
+
+COLUMNS = sorted(column for _, columns in SENSORS.values() for column in columns)
+
+
+def from_file(path, end):
+    """Calculates the statistics of every window from the rows of a data file"""
+    rows = list(read_rows(path))
+    statistics = {}
+    for seconds in WINDOWS:
+        start = (end - datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+        window = [row for row in rows if row["Timestamp"] > start]
+        statistics[seconds] = {}
+        for column in COLUMNS:
+            values = [row[column] for row in window if not math.isnan(row[column])]
+            statistics[seconds][column] = (sum(values) / len(values), min(values), max(values)) if values else None
+    return statistics
+
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 1440
+    rng = random.Random(1)
+    start = datetime.datetime(2021, 6, 1)
+    rows = [
+        [rng.gauss(SIGNALS[column][0], SIGNALS[column][2]) if rng.random() > 0.01 else math.nan for column in COLUMNS]
+        for _ in range(cycles)
+    ]
+
+    import numpy  # only the history's own memory is traced
+
+    tracemalloc.start()
+    history = History(COLUMNS)
+    start_time = time.perf_counter()
+    for i, row in enumerate(rows):
+        history.append(start + datetime.timedelta(minutes=i), row)
+        statistics = [history.statistics(seconds) for seconds in WINDOWS]
+    in_memory = (time.perf_counter() - start_time) / cycles
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        writer = DailyCsvWriter("00", COLUMNS, data_dir=data_dir)
+        for i, row in enumerate(rows):
+            writer.write(start + datetime.timedelta(minutes=i), row)
+        writer.close()
+        end = start + datetime.timedelta(minutes=cycles - 1)
+        path = writer.path_for(start)
+        start_time = time.perf_counter()
+        repeats = 5
+        for _ in range(repeats):
+            from_file(path, end)
+        reread = (time.perf_counter() - start_time) / repeats
+
+    print(f"history: {in_memory * 1e3:.3f} ms per cycle (append + statistics), {memory / 1024:.0f} KiB allocated")
+    print(f"re-reading a file of {cycles} rows: {reread * 1e3:.1f} ms per cycle")
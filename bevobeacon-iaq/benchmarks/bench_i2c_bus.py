@@ -0,0 +1,75 @@
+"""Benchmark - Shared I2C Bus
+
+Drives the simulated I2C sensors on one fake bus from three threads at once, as
+happens on the beacon: the scan worker reading every sensor, the event loop
+enabling and disabling the sensors, and data-ready checks. Compares sensors that
+each use the bus without coordinating (no lock) against sensors sharing the bus
+manager, reporting the overlapping transfers the fake bus saw - which would
+corrupt both transfers on a real bus - and the per-device transaction statistics.
+
+Usage: python3 benchmarks/bench_i2c_bus.py [seconds] [transfer latency] [error rate]
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from hal import create_sensors
+from i2c_bus import I2CBus, FakeI2C
+
+NAMES = ["sgp", "tsl", "sps", "scd"]
+
+
+def repeat(stop, fxn):
+    while not stop.is_set():
+        fxn()
+
+
+def run(lock, seconds, latency, error_rate):
+    bus = I2CBus(FakeI2C(latency=latency, error_rate=error_rate, seed=1), lock=lock)
+    sensors = create_sensors("simulated", names=NAMES, seed=1, latency=latency, i2c=bus)
+
+    def scan():
+        for name in NAMES:
+            sensors[name].read()
+
+    def toggle():
+        for name in ("tsl", "sps", "scd"):
+            with contextlib.suppress(OSError):
+                sensors[name].enable()
+                sensors[name].disable()
+
+    def check():
+        for name in NAMES:
+            sensors[name].data_ready()
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=repeat, args=(stop, fxn)) for fxn in (scan, toggle, check)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return bus
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    logging.basicConfig(level=logging.ERROR)
+
+    for label, lock in [("uncoordinated", contextlib.nullcontext()), ("bus manager", None)]:
+        bus = run(lock, seconds, latency, error_rate)
+        handle = bus.handle
+        print(f"{label}: {handle.transfers} transfers, {handle.collisions} overlapping")
+        for device, statistics in bus.statistics().items():
+            print(
+                f"  {device:<4} {statistics['transactions']:>6} transactions  {statistics['errors']:>4} errors  "
+                f"p50 {statistics['p50'] * 1e3:5.2f} ms  p95 {statistics['p95'] * 1e3:5.2f} ms  max {statistics['max'] * 1e3:5.2f} ms"
+            )
@@ -0,0 +1,68 @@
+"""Benchmark - Startup Imports
+
+Captures the import profile (python -X importtime) of the modules loaded when the
+sensor and display services start and reports the total import time, the slowest
+imports, and whether any of the heavy libraries that are only needed later
+(pandas, NumPy, boto3) were loaded before the first scan.
+
+On a beacon pass "main" or "display" to profile the services themselves - off the
+device the driver libraries are not installed, so the default profiles the
+modules the services share.
+
+Usage: python3 benchmarks/bench_imports.py [module ...]
+"""
+import os
+import sys
+import subprocess
+
+PARENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# modules imported by main and display besides the sensor/display drivers
+SERVICE_MODULES = [
+    "scanner", "aggregate", "storage", "channel", "calibration", "summary", "upload",
+    "history", "hal", "scheduler", "metrics", "i2c_bus",
+]
+DEFERRED = ["pandas", "numpy", "boto3", "botocore"]
+
+
+def capture(modules):
+    """
+    Runs a fresh interpreter that imports the modules
+
+    Returns
+    -------
+    imports : list of tuple
+        name, self time (us), and cumulative time (us) of each imported module
+    """
+    paths = [PARENT, os.path.join(PARENT, "display")]
+    code = f"import sys; sys.path[:0] = {paths!r}; " + "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(own), int(cumulative)))
+    return imports
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or SERVICE_MODULES
+
+    try:
+        imports = capture(modules)
+    except ImportError as e:
+        sys.exit(f"Could not import {modules}: {e}")
+
+    top_level = [cumulative for name, _, cumulative in imports if name in modules]
+    print(f"imported {len(imports)} modules in {sum(top_level) / 1000:.1f} ms for {', '.join(modules)}")
+    print("slowest imports (cumulative):")
+    for name, _, cumulative in sorted(imports, key=lambda x: x[2], reverse=True)[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = sorted({name for name, _, _ in imports if name.split(".")[0] in DEFERRED})
+    deferred = sorted({name.split(".")[0] for name in loaded})
+    print(f"deferred libraries loaded at startup: {', '.join(deferred) if deferred else 'none'}")
@@ -0,0 +1,73 @@
+"""Benchmark - Incremental Uploads
+
+Simulates a day of one-minute rows shipped to a fake S3 bucket every 15 minutes as
+compressed chunks, followed by compaction into the full day's file, and compares
+the bytes sent and the delay before a row reaches the bucket with the daily
+upload of the whole file.
+
+Usage: python3 benchmarks/bench_incremental.py [chunk minutes]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import datetime
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+from storage import DailyCsvWriter
+from upload import UploadQueue, IncrementalShipper
+from bench_upload import FakeS3
+
+COLUMNS = [f"measurement_{i}-unit" for i in range(30)]
+
+
+def wait_for(queue, timeout=60):
+    stop = time.monotonic() + timeout
+    while queue.pending and time.monotonic() < stop:
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    chunk_minutes = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        s3 = FakeS3(latency=0.001, failure_rate=0.1)
+        uploads = UploadQueue(s3, "bucket", journal=os.path.join(data_dir, "uploads.journal"), base_delay=0.001, max_delay=0.01)
+        shipper = IncrementalShipper(uploads, "B00/", chunk_dir=os.path.join(data_dir, "chunks"), state=os.path.join(data_dir, "uploads.offsets"))
+        uploads.start()
+
+        writer = DailyCsvWriter("00", COLUMNS, data_dir=data_dir)
+        start = datetime.datetime(2021, 1, 1)
+        sent = 0
+        for minute in range(1440):
+            writer.write(start + datetime.timedelta(minutes=minute), [round(random.uniform(0, 1000), 1) for _ in COLUMNS])
+            if (minute + 1) % chunk_minutes == 0:
+                key = shipper.ship(writer.path)
+                wait_for(uploads)
+                sent += len(s3.objects.get(("bucket", key), b""))
+        path = writer.path
+        writer.close()
+
+        shipper.finish(path)
+        wait_for(uploads)
+        uploads.close()
+
+        size = os.path.getsize(path)
+        chunks = [key for _, key in s3.objects if "/chunks/" in key]
+        print(f"day file:              {size / 1024:8.1f} KiB")
+        print(f"chunks sent:           {sent / 1024:8.1f} KiB in {1440 // chunk_minutes} chunks (data available within {chunk_minutes} min)")
+        compacted = len(s3.objects[("bucket", "B00/data/" + os.path.basename(path))])
+        print(f"full file (compaction): {compacted / 1024:7.1f} KiB (compressed like the chunks)")
+        print(f"incremental total:     {(sent + compacted) / 1024:8.1f} KiB")
+        print(f"chunk objects left:    {len(chunks):8d}")
+        # a restart rewrites the journal with what is still needed
+        restarted = UploadQueue(s3, "bucket", journal=os.path.join(data_dir, "uploads.journal"))
+        with open(restarted.journal) as f:
+            print(f"upload journal:        {sum(1 for _ in f):8d} entries after a restart")
+        print(f"daily upload:          {size / 1024:8.1f} KiB once (data available within 24 h)")
@@ -0,0 +1,53 @@
+"""Benchmark - Latest Row Reader
+
+Compares the display's refresh cost of reading the whole day's CSV with pandas
+against the LatestRowReader, which only reads the end of the file, for files of
+increasing length. Each refresh follows a newly appended row so the reader cannot
+answer from its cache.
+
+Usage: python3 benchmarks/bench_latest_row.py
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import DailyCsvWriter, LatestRowReader
+
+COLUMNS = [f"measurement_{i}-unit" for i in range(30)]
+
+
+def pandas_latest(path):
+    import pandas as pd
+    return pd.read_csv(path, index_col=0).values[-1]
+
+
+def measure(fxn, writer, date, refreshes=20):
+    fxn(writer.path)  # warm up imports and caches
+    elapsed = 0
+    for i in range(refreshes):
+        writer.write(date + datetime.timedelta(seconds=i), [random.uniform(0, 1000) for _ in COLUMNS])
+        start_time = time.perf_counter()
+        fxn(writer.path)
+        elapsed += time.perf_counter() - start_time
+    return elapsed / refreshes
+
+
+if __name__ == "__main__":
+    reader = LatestRowReader()
+    print(f"{'rows':>8s} {'pandas':>12s} {'tail read':>12s}")
+    for rows in [10, 100, 1440, 14400]:
+        with tempfile.TemporaryDirectory() as data_dir:
+            writer = DailyCsvWriter("00", COLUMNS, data_dir=data_dir)
+            date = datetime.datetime(2021, 1, 1)
+            for i in range(rows):
+                writer.write(date, [random.uniform(0, 1000) for _ in COLUMNS])
+
+            pandas_time = measure(pandas_latest, writer, date)
+            reader_time = measure(reader.read, writer, date)
+            writer.close()
+        print(f"{rows:8d} {pandas_time * 1e3:9.3f} ms {reader_time * 1e3:9.3f} ms")
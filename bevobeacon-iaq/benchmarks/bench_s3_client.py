@@ -0,0 +1,53 @@
+"""Benchmark - S3 Client Startup
+
+Compares the startup time and memory (peak RSS) of a fresh interpreter that
+imports boto3 and creates an S3 client up front, as main used to do, against one
+that only creates the lazy S3Client. Each case runs in its own process so the
+numbers are not affected by modules that are already loaded.
+
+Usage: python3 benchmarks/bench_s3_client.py [repeats]
+"""
+import os
+import sys
+import json
+import subprocess
+
+PARENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MEASURE = """
+import sys, time, json, resource
+sys.path.insert(0, {parent!r})
+start_time = time.perf_counter()
+{setup}
+elapsed = time.perf_counter() - start_time
+print(json.dumps({{"seconds": elapsed, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+CASES = {
+    "baseline (no client)": "pass",
+    "eager boto3 client": "import boto3\ns3 = boto3.client('s3', aws_access_key_id='', aws_secret_access_key='')",
+    "lazy S3Client": "from upload import S3Client\ns3 = S3Client('', '')",
+}
+
+
+def measure(setup):
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(parent=PARENT, setup=setup)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout)
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for name, setup in CASES.items():
+        results = [measure(setup) for _ in range(repeats)]
+        if None in results:
+            print(f"{name:<22} failed - is boto3 installed?")
+            continue
+        seconds = sorted(result["seconds"] for result in results)[repeats // 2]
+        rss = max(result["rss"] for result in results)
+        print(f"{name:<22} {seconds * 1000:8.1f} ms  {rss / 1024:6.1f} MiB peak RSS")
@@ -0,0 +1,67 @@
+"""Benchmark - Scan Engine
+
+Compares the cycle time of reading every sensor one after the other against the
+executor-backed Scanner using fake sensors that block in their driver calls the
+way the I2C and serial libraries do.
+
+Usage: python3 benchmarks/bench_scanner.py
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scanner import Scanner
+
+
+class FakeSensor:
+
+    def __init__(self, bus, delay) -> None:
+        self.bus = bus
+        self.delay = delay
+
+    def read(self):
+        time.sleep(self.delay)
+        return {"value": 1.0}
+
+
+def make_sensors():
+    """Mirrors the beacon's layout: four I2C sensors and two serial gas sensors"""
+    return {
+        "sgp": FakeSensor("i2c", 0.02),
+        "tsl": FakeSensor("i2c", 0.11),
+        "sps": FakeSensor("i2c", 0.05),
+        "scd": FakeSensor("i2c", 0.05),
+        "dgs_co": FakeSensor("/dev/ttyUSB1", 0.15),
+        "dgs_no2": FakeSensor("/dev/ttyUSB0", 0.15),
+    }
+
+
+def sequential(sensors, samples=5):
+    return {name: [sensor.read() for _ in range(samples)] for name, sensor in sensors.items()}
+
+
+async def concurrent(scanner):
+    return await scanner.scan_all()
+
+
+if __name__ == "__main__":
+    sensors = make_sensors()
+
+    start_time = time.perf_counter()
+    sequential(sensors)
+    sequential_time = time.perf_counter() - start_time
+
+    scanner = Scanner(sensors, samples=5)
+    start_time = time.perf_counter()
+    asyncio.run(concurrent(scanner))
+    concurrent_time = time.perf_counter() - start_time
+    scanner.shutdown()
+
+    i2c_time = sum(s.delay for s in sensors.values() if s.bus == "i2c") * 5
+    print(f"sequential: {sequential_time:.3f} s")
+    print(f"scanner:    {concurrent_time:.3f} s (slowest bus: {i2c_time:.3f} s)")
+    for name, latency in scanner.latency.items():
+        print(f"    {name:8s} {latency:.3f} s")
@@ -0,0 +1,102 @@
+"""Benchmark - Cycle Scheduler
+
+Drives the scheduler with a fake clock that only moves when it is advanced, so
+hours of cycles run instantly and every path can be checked: steady cycles, a
+cycle that overruns (late), falling behind with and without catching up
+(skipped), the wall clock jumping forward and back, and a restart within a
+minute that was already recorded. Each scenario lists the timestamps and counts
+it should produce and the script exits with an error if any differ. Also reports
+the time the scheduler itself takes per cycle.
+
+Usage: python3 benchmarks/bench_scheduler.py [cycles]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from clock import FakeClock
+from scheduler import Scheduler
+
+START = datetime.datetime(2021, 6, 1, 12, 0)
+
+
+async def run(steps, catch_up=0, clock=None, last=None):
+    """
+    Runs one cycle per step on a fake clock
+
+    Parameters
+    ----------
+    steps : list of tuple
+        seconds each cycle takes and seconds the wall clock jumps after it
+    catch_up : int, default 0
+        passed to the scheduler
+    clock : FakeClock, default None
+        clock to continue from - a new one at START if not provided
+    last : float, default None
+        passed to the scheduler
+
+    Returns
+    -------
+    minutes : list of int
+        minutes after START of each cycle's timestamp
+    counts : dict
+        cycles, late, skipped, and jumps counted by the scheduler
+    """
+    clock = FakeClock(START) if clock is None else clock
+    scheduler = Scheduler(clock, period=60, catch_up=catch_up, last=last)
+    minutes = []
+    for work, jump in steps:
+        timestamp = await scheduler.next()
+        minutes.append(round((timestamp - START).total_seconds() / 60))
+        clock.advance(work)
+        clock.jump(jump)
+    counts = {name: getattr(scheduler, name) for name in ("cycles", "late", "skipped", "jumps")}
+    return minutes, counts
+
+
+async def restart():
+    """Runs one cycle, restarts 20 s into the minute, and runs two more"""
+    clock = FakeClock(START)
+    first, _ = await run([(20, 0)], clock=clock)
+    minutes, counts = await run([(5, 0), (5, 0)], clock=clock, last=START.timestamp())
+    return first + minutes, counts
+
+
+SCENARIOS = [
+    # name, function creating the run, expected minutes, expected counts
+    ("steady", lambda: run([(5, 0)] * 4), [0, 1, 2, 3], {"late": 0, "skipped": 0, "jumps": 0}),
+    ("overrun", lambda: run([(65, 0), (5, 0), (5, 0)]), [0, 1, 2], {"late": 1, "skipped": 0, "jumps": 0}),
+    ("skip", lambda: run([(150, 0), (5, 0), (5, 0)]), [0, 2, 3], {"late": 1, "skipped": 1, "jumps": 0}),
+    ("catch up", lambda: run([(150, 0), (5, 0), (5, 0)], catch_up=2), [0, 1, 2], {"late": 2, "skipped": 0, "jumps": 0}),
+    ("jump forward", lambda: run([(5, 3600), (5, 0), (5, 0)]), [0, 61, 62], {"late": 0, "skipped": 0, "jumps": 1}),
+    ("jump back", lambda: run([(5, -3600), (5, 0), (5, 0)]), [0, -59, -58], {"late": 0, "skipped": 0, "jumps": 1}),
+    ("restart", restart, [0, 1, 2], {"late": 0, "skipped": 0, "jumps": 0}),
+]
+
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    logging.basicConfig(level=logging.ERROR)
+
+    failed = 0
+    for name, scenario, expected_minutes, expected_counts in SCENARIOS:
+        minutes, counts = asyncio.run(scenario())
+        ok = minutes == expected_minutes and all(counts[key] == value for key, value in expected_counts.items())
+        failed += not ok
+        print(
+            f"{name:<13} {'ok' if ok else 'FAILED':<6} minutes {minutes}  late {counts['late']}  "
+            f"skipped {counts['skipped']}  jumps {counts['jumps']}"
+            + ("" if ok else f"  (expected minutes {expected_minutes}, {expected_counts})")
+        )
+
+    start_time = time.perf_counter()
+    asyncio.run(run([(1, 0)] * cycles))
+    print(f"scheduler: {(time.perf_counter() - start_time) / cycles * 1e6:.1f} us per cycle over {cycles} cycles")
+
+    if failed:
+        sys.exit(f"{failed} scenario(s) failed")
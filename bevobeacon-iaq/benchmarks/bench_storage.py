@@ -0,0 +1,68 @@
+"""Benchmark - Data File Writer
+
+Compares the rows per second of the DailyCsvWriter, which keeps the day's file
+open, against appending a one-row DataFrame with to_csv (reopening the file for
+every row) as main used to do.
+
+Usage: python3 benchmarks/bench_storage.py [rows]
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import DailyCsvWriter
+
+COLUMNS = [f"measurement_{i}-unit" for i in range(30)]
+
+
+def make_rows(n):
+    start = datetime.datetime(2021, 1, 1)
+    return [
+        (start + datetime.timedelta(minutes=i), [random.uniform(0, 1000) for _ in COLUMNS])
+        for i in range(n)
+    ]
+
+
+def to_csv_append(data_dir, rows):
+    import pandas as pd
+    for date, values in rows:
+        filename = f'{data_dir}/b00_{date.strftime("%Y-%m-%d")}.csv'
+        df = pd.DataFrame([values], columns=COLUMNS, index=pd.Index([date.strftime("%Y-%m-%d %H:%M:%S")], name="Timestamp"))
+        if os.path.isfile(filename):
+            df.to_csv(filename, mode="a", header=False)
+        else:
+            df.to_csv(filename)
+
+
+def writer_append(data_dir, rows, **kwargs):
+    writer = DailyCsvWriter("00", COLUMNS, data_dir=data_dir, **kwargs)
+    for date, values in rows:
+        writer.write(date, values)
+    writer.close()
+
+
+def measure(fxn, rows):
+    with tempfile.TemporaryDirectory() as data_dir:
+        start_time = time.perf_counter()
+        fxn(data_dir, rows)
+        return len(rows) / (time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = make_rows(n)
+
+    cases = [
+        ("to_csv append", to_csv_append),
+        ("writer, flush every row", lambda d, r: writer_append(d, r, flush_rows=1)),
+        ("writer, fsync every row", lambda d, r: writer_append(d, r, flush_rows=1, fsync=True)),
+        ("writer, flush every 10 rows", lambda d, r: writer_append(d, r, flush_rows=10)),
+        ("writer, flush every 60 s", lambda d, r: writer_append(d, r, flush_rows=None, flush_seconds=60)),
+    ]
+    for label, fxn in cases:
+        print(f"{label:30s} {measure(fxn, rows):10.0f} rows/s")
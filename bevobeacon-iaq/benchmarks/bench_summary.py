@@ -0,0 +1,82 @@
+"""Benchmark - Summary Generation on the Upload Cycle
+
+Measures how long the upload cycle is held up by generating the daily summary:
+spawning calculate_summary_stats.py in a new interpreter (as main did before),
+running Calculate in-process, and saving the running SummaryAccumulator result
+from a worker thread while the event loop keeps running.
+
+Usage: python3 benchmarks/bench_summary.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import datetime
+import tempfile
+import subprocess
+
+HERE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, HERE)
+
+from storage import DailyCsvWriter, read_rows
+from calibration import CorrectionRegistry
+from summary import SummaryAccumulator, save_summary
+
+COLUMNS = sorted([
+    "carbon_dioxide-ppm", "pm2p5_mass-microgram_per_m3", "carbon_monoxide-ppb",
+    "t_from_no2-c", "rh_from_no2-percent", "t_from_co2-c", "rh_from_co2-percent",
+])
+
+
+def make_day(data_dir, beacon="01"):
+    """Writes a full day of one-minute rows dated today"""
+    writer = DailyCsvWriter(beacon, COLUMNS, data_dir=data_dir, flush_rows=None)
+    start = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for i in range(1440):
+        writer.write(start + datetime.timedelta(minutes=i), [random.uniform(0, 1500) for _ in COLUMNS])
+    path = writer.path
+    writer.close()
+    return path
+
+
+async def loop_stall(fxn):
+    """Runs fxn in a worker thread and reports the longest gap between event loop ticks"""
+    longest = 0
+    done = False
+
+    async def ticker():
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.get_running_loop().run_in_executor(None, fxn)
+    done = True
+    await task
+    return longest
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as data_dir:
+        save_dir = data_dir + "/"
+        path = make_day(data_dir)
+
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(HERE, "calculate_summary_stats.py"), "01", save_dir, data_dir], check=True)
+        print(f"{'new interpreter (blocking)':32s} {time.perf_counter() - start_time:8.3f} s")
+
+        from calculate_summary_stats import Calculate
+        start_time = time.perf_counter()
+        Calculate("01", data_dir=data_dir, save_dir=save_dir).run()
+        print(f"{'Calculate in-process':32s} {time.perf_counter() - start_time:8.3f} s")
+
+        summary = SummaryAccumulator("01", date=datetime.date.today(), corrections=CorrectionRegistry())
+        summary.add_rows(read_rows(path))
+        start_time = time.perf_counter()
+        stall = asyncio.run(loop_stall(lambda: save_summary(summary.result(), "01", summary.date, save_dir)))
+        print(f"{'accumulator in worker thread':32s} {time.perf_counter() - start_time:8.3f} s (loop stalled {stall * 1e3:.1f} ms)")
@@ -0,0 +1,93 @@
+"""Benchmark - Upload Queue
+
+Runs the UploadQueue against a local stand-in for the S3 client that adds latency
+and fails a share of the uploads, then simulates a restart with uploads still
+pending. Reports how long queuing blocked the caller and how long it took for
+every file to reach the fake bucket.
+
+Usage: python3 benchmarks/bench_upload.py [files] [failure rate]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from upload import UploadQueue
+
+
+class FakeS3:
+    """Stores uploaded files in memory after a delay, failing some of the uploads"""
+
+    def __init__(self, latency=0.05, failure_rate=0.3) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.objects = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("simulated network failure")
+        with open(filename, "rb") as f:
+            data = f.read()
+        with self.lock:
+            self.objects[(bucket, key)] = data
+
+    def delete_object(self, Bucket, Key):
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+
+
+def wait_for(queue, timeout=60):
+    stop = time.monotonic() + timeout
+    while queue.pending and time.monotonic() < stop:
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        files = []
+        for i in range(n):
+            path = os.path.join(data_dir, f"b00_2021-01-{i + 1:02d}.csv")
+            with open(path, "w") as f:
+                f.write("Timestamp,value\n" * 100)
+            files.append(path)
+        journal = os.path.join(data_dir, "uploads.journal")
+
+        # first run - the network goes down part way through
+        s3 = FakeS3(failure_rate=1.0)
+        queue = UploadQueue(s3, "bucket", journal=journal, base_delay=0.01, max_delay=0.1)
+        queue.start()
+        start_time = time.perf_counter()
+        for path in files:
+            queue.put(path, f"B00/data/{os.path.basename(path)}")
+        blocked = time.perf_counter() - start_time
+        time.sleep(0.2)
+        queue.close()
+        print(f"queued {n} files in {blocked * 1e3:.1f} ms, {len(queue.pending)} pending at restart")
+
+        # second run - resumes from the journal over a flaky connection
+        s3 = FakeS3(failure_rate=failure_rate)
+        queue = UploadQueue(s3, "bucket", journal=journal, base_delay=0.01, max_delay=0.1)
+        start_time = time.perf_counter()
+        queue.start()
+        wait_for(queue)
+        queue.close()
+        print(f"uploaded {len(s3.objects)}/{n} files in {time.perf_counter() - start_time:.2f} s ({s3.calls} attempts)")
+
+        # third run - nothing is left to catch up
+        queue = UploadQueue(s3, "bucket", journal=journal)
+        missing = queue.missing(files, lambda path: f"B00/data/{os.path.basename(path)}")
+        print(f"missing after restart: {len(missing)}")
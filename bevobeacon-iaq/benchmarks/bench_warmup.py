@@ -0,0 +1,59 @@
+"""Benchmark - Sensor Warmup
+
+Compares how long the sensors stay enabled per cycle with the fixed 0.5 s wait
+followed by five reads of every sensor, against sampling each sensor as soon as
+it has warmed up and has new data. Uses the simulated sensors, whose warmup and
+sample intervals follow the real ones, and reports the samples taken and the time
+spent waiting for data by each sensor. Like main, there is no budget unless one
+is given, so every sensor gives all five samples.
+
+Usage: python3 benchmarks/bench_warmup.py [cycles] [budget]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from hal import create_sensors, MANUALLY_ENABLED
+from scanner import Scanner
+
+
+async def cycle(scanner, sensors, mode):
+    start = time.monotonic()
+    for name in MANUALLY_ENABLED:
+        sensors[name].enable()
+    if mode == "ready":
+        readings = await scanner.acquire_all(start=start)
+    else:
+        await asyncio.sleep(0.5)
+        readings = await scanner.scan_all()
+    for name in MANUALLY_ENABLED:
+        sensors[name].disable()
+    return time.monotonic() - start, readings
+
+
+async def run(mode, cycles, budget):
+    sensors = create_sensors("simulated", seed=1)
+    scanner = Scanner(sensors, samples=5, budget=budget)
+    active = []
+    for _ in range(cycles):
+        seconds, readings = await cycle(scanner, sensors, mode)
+        active.append(seconds)
+    scanner.shutdown()
+    return sum(active) / len(active), readings, scanner
+
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    logging.basicConfig(level=logging.ERROR)
+
+    for mode in ["fixed", "ready"]:
+        active, readings, scanner = asyncio.run(run(mode, cycles, budget))
+        print(f"{mode}: sensors enabled for {active:.2f} s per cycle")
+        for name in readings:
+            waiting = f", {scanner.waiting[name]:.2f} s waiting for data" if mode == "ready" else ""
+            print(f"  {name:<8} {len(readings[name])} samples in {scanner.latency[name]:.2f} s{waiting}")
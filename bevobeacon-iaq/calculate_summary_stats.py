@@ -10,16 +10,16 @@ Project: BEVO Beacon
 """
 import sys
 import os
-import json
-
-import pandas as pd
-import numpy as np
 
 from datetime import datetime
 
+from storage import read_binary
+from calibration import CorrectionRegistry
+from summary import SummaryAccumulator, get_pollutant_units, get_pollutant_name, save_summary
+
 class Calculate:
 
-    def __init__(self, beacon, data_dir="/home/pi/DATA/", save_dir="/home/pi/summary_data/", correct=True) -> None:
+    def __init__(self, beacon, data_dir="/home/pi/DATA/", save_dir="/home/pi/summary_data/", correct=True, corrections=None, data=None) -> None:
         """
         Parameters
         ----------
@@ -29,6 +29,12 @@ class Calculate:
             path to raw data
         save_dir : str, "~/summary_data/"
             path to save location
+        correct : boolean, default True
+            whether to apply the correction models to the raw data
+        corrections : CorrectionRegistry, default None
+            loaded correction models - read from the correction directory if not provided
+        data : DataFrame, default None
+            raw data to use instead of reading today's file
 
         Creates
         -------
@@ -47,14 +53,43 @@ class Calculate:
         self.data_dir = data_dir
         self.save_dir = save_dir
 
+        self.corrections = corrections if corrections is not None else CorrectionRegistry()
+
         self.date = datetime.now().date()
         date_str = datetime.strftime(self.date,"%Y-%m-%d")
-        raw_data = pd.read_csv(f"{self.data_dir}/b{beacon}_{date_str}.csv")
+        if data is None:
+            raw_data = self.read_raw_data(f"{self.data_dir}/b{beacon}_{date_str}")
+        else:
+            raw_data = data
         if correct:
             self.data = self.correct_raw_data(raw_data)
         else:
             self.data = self.correct_headings(raw_data)
 
+    def read_raw_data(self,filename):
+        """
+        Reads raw data from the csv file or, if there is none, the binary file
+
+        Parameters
+        ----------
+        filename : str
+            location of the data file without the extension
+
+        Returns
+        -------
+        <data> : DataFrame
+            raw data with a "Timestamp" column
+        """
+        import pandas as pd
+
+        if os.path.isfile(f"{filename}.csv") or not os.path.isfile(f"{filename}.bin"):
+            return pd.read_csv(f"{filename}.csv")
+
+        records = read_binary(f"{filename}.bin")
+        data = pd.DataFrame(records)
+        data["Timestamp"] = pd.to_datetime(data["timestamp"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+        return data.drop(columns="timestamp")[["Timestamp", *records.dtype.names[1:]]]
+
     def correct_headings(self,data):
         """
         Corrects headings from the raw data
@@ -78,7 +113,7 @@ class Calculate:
                     "RH_NO2":"rh","rh_from_no2-percent":"rh"}
         return data.rename(columns=rename_map)
 
-    def correct_raw_data(self,data,iaq_params=["co2","pm2p5_mass","co","temperature_c","rh"]):
+    def correct_raw_data(self,data,iaq_params=["co2","pm2p5_mass","co","temperature_c","rh"],beacon_column=None):
         """
         Uses locally stored calibration files to correct raw IAQ readings
 
@@ -88,6 +123,9 @@ class Calculate:
             raw data to be corrected
         iaq_params : list of str
             names of parameters to be corrected
+        beacon_column : str, default None
+            column holding the beacon number of each row when the data come from
+            several beacons - the class beacon is used if not provided
 
         Returns
         -------
@@ -95,70 +133,22 @@ class Calculate:
             raw data processed through available correction models
         """
         df = self.correct_headings(data)
-        for iaq_param in iaq_params:
-            # correcting the value 
-            path_to_correction = "/home/pi/bevo_iaq/bevobeacon-iaq/correction/"
-            if os.path.exists(path_to_correction):
-                for file in os.listdir(path_to_correction):
-                    file_info = file.split("-")
-                    if file_info[0] == iaq_param.lower():
-                        correction = pd.read_csv(f"{path_to_correction}{file}",index_col=0)
-                    else:
-                        correction = pd.DataFrame(data={"beacon":np.arange(0,51),"constant":np.zeros(51),"coefficient":np.ones(51)}).set_index("beacon")
-                
-                df[iaq_param] = df[iaq_param] * correction.loc[int(self.beacon),"coefficient"] + correction.loc[int(self.beacon),"constant"]
-
-            if iaq_param == "co":
-                df[iaq_param] /= 1000
+        beacons = self.beacon if beacon_column is None else df[beacon_column].to_numpy()
+        # correcting all values at once
+        df[iaq_params] = self.corrections.apply_many(iaq_params, df[iaq_params].to_numpy(dtype=float), beacons)
+
+        if "co" in iaq_params:
+            df["co"] /= 1000
 
         return df
 
     def get_pollutant_units(self,pollutant):
         """Gets the formated label for the pollutant"""
-        if pollutant == "co2":
-            return "ppm"
-        elif pollutant == "co":
-            return "ppb"
-        elif pollutant == "pm2p5_mass":
-            return "microgram_per_m3"
-        elif pollutant == "pm2p5_number":
-            return "#/cm3"
-        elif pollutant == "no2":
-            return "ppb"
-        elif pollutant == "tvoc":
-            return "ppb"
-        elif pollutant == "temperature_c":
-            return "c"
-        elif pollutant == "rh":
-            return "percent"
-        elif pollutant in ["lux","light"]:
-            return "lux"
-        else:
-            return ""
+        return get_pollutant_units(pollutant)
 
     def get_pollutant_name(self,pollutant):
         """Gets a more formal representation of the pollutant"""
-        if pollutant == "co2":
-            return "carbon_dioxide"
-        elif pollutant == "co":
-            return "carbon_monoxide"
-        elif pollutant == "pm2p5_mass":
-            return "pm2p5_mass"
-        elif pollutant == "pm2p5_number":
-            return "pm2p5_number"
-        elif pollutant == "no2":
-            return "nitrogen_dioxide"
-        elif pollutant == "tvoc":
-            return "total_volatile_organic_compounds"
-        elif pollutant == "temperature_c":
-            return "temperature"
-        elif pollutant == "rh":
-            return "relative_humidity"
-        elif pollutant in ["lux","light"]:
-            return "light"
-        else:
-            return ""
-
+        return get_pollutant_name(pollutant)
 
     def get_statistics(self,iaq_params={"co2":1100,"pm2p5_mass":12,"co":4,"temperature_c":27,"rh":60}):
         """
@@ -174,6 +164,8 @@ class Calculate:
         res : dict of dict
             dictionary indexed by pollutant containing dictionaries with summar statistics
         """
+        import numpy as np
+
         res = {} # overall results
         for iaq_param in iaq_params.keys():
             iaq_res = {} # specific parameter results
@@ -194,6 +186,25 @@ class Calculate:
 
         return res
 
+    def accumulate(self,iaq_params={"co2":1100,"pm2p5_mass":12,"co":4,"temperature_c":27,"rh":60}):
+        """
+        Loads the data into a streaming accumulator, e.g. to merge days for weekly/monthly rollups
+
+        Parameters
+        ----------
+        iaq_params : dict, default {"co2":1100,"pm2p5_mass":12,"co":4,"temperature_c":27,"rh":60}
+            pollutants to consider with thresholds
+
+        Returns
+        -------
+        acc : SummaryAccumulator
+            accumulator holding the (corrected) data
+        """
+        acc = SummaryAccumulator(self.beacon, date=self.date, thresholds=iaq_params)
+        for iaq_param, stats in acc.stats.items():
+            stats.add_many(self.data[iaq_param].to_numpy(dtype=float))
+        return acc
+
     def save(self,d,save_dir=None):
         """
         Saves dictionary as json file to specified location
@@ -204,15 +215,17 @@ class Calculate:
             object to save
         save_dir : str, default None
             location to save the data in case the class location is not desired
+
+        Returns
+        -------
+        save_path : str
+            location of the saved file
         """
         # Getting save path
         if save_dir == None:
-            save_path = f"{self.save_dir}b{self.beacon}-summary-{self.date.strftime('%Y-%m-%d')}.json"
-        else:
-            save_path = f"{save_dir}b{self.beacon}-summary-{self.date.strftime('%Y-%m-%d')}.json"
+            save_dir = self.save_dir
         # saving as json to location
-        with open(save_path, 'w') as f:
-            json.dump(d, f,indent=4)
+        return save_summary(d, self.beacon, self.date, save_dir)
 
     def run(self):
         """
@@ -237,6 +250,11 @@ if __name__ == "__main__":
         save_dir = sys.argv[2]
     except IndexError:
         save_dir = "/home/pi/summary_data/" # defaults if no argument provided
+    ## data_dir
+    try:
+        data_dir = sys.argv[3]
+    except IndexError:
+        data_dir = "/home/pi/DATA/" # defaults if no argument provided
     
-    calculate = Calculate(beacon=beacon,save_dir=save_dir)
+    calculate = Calculate(beacon=beacon,data_dir=data_dir,save_dir=save_dir)
     calculate.run()
\ No newline at end of file
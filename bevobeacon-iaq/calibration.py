@@ -0,0 +1,216 @@
+"""Calibration
+
+This script loads the linear correction models stored in the correction directory
+(files named "<parameter>-linear_model-<campaign>.csv" with one coefficient and
+constant per beacon) once and applies them to raw measurements. The files are
+only read again when they change.
+
+Several parameters can be corrected at once, including data from many beacons
+(e.g. when reprocessing fleet archives), by broadcasting coefficient and constant
+tables over the data matrix. NumPy is only imported for these batch corrections so
+correcting single readings does not slow down the start of the sensor service.
+"""
+import os
+import csv
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "correction")
+
+
+class CorrectionRegistry:
+
+    def __init__(self, path=DEFAULT_PATH, check_interval=60) -> None:
+        """
+        Parameters
+        ----------
+        path : str, default "<this directory>/correction"
+            location of the correction files
+        check_interval : float, default 60
+            minimum number of seconds between checks for changed files
+
+        Creates
+        -------
+        models : dict of tuple
+            coefficient and constant arrays indexed by beacon number for each parameter
+        """
+        self.path = path
+        self.check_interval = check_interval
+
+        self.models = {}
+        self.mtimes = {}
+        self.last_check = None
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """
+        Reloads correction files that were added, changed, or removed
+
+        Parameters
+        ----------
+        force : boolean, default False
+            check the files even if the check interval has not passed
+        """
+        now = time.monotonic()
+        if not force and self.last_check is not None and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+
+        mtimes = {}
+        if os.path.isdir(self.path):
+            for file in os.listdir(self.path):
+                if "-linear_model-" in file and file.endswith(".csv"):
+                    mtimes[file] = os.path.getmtime(os.path.join(self.path, file))
+        if mtimes == self.mtimes:
+            return
+
+        models = {}
+        for file in sorted(mtimes):
+            param = file.split("-")[0].lower()
+            try:
+                models[param] = self.load(os.path.join(self.path, file))
+            except (OSError, KeyError, ValueError) as e:
+                log.warning(f"Could not load correction file {file}: {e}")
+        self.models = models
+        self.mtimes = mtimes
+        log.info(f"Loaded corrections for {list(models)}")
+
+    @staticmethod
+    def load(filename):
+        """
+        Reads a correction file
+
+        Parameters
+        ----------
+        filename : str
+            location of the correction file
+
+        Returns
+        -------
+        coefficient, constant : list of float
+            values indexed by beacon number - beacons without a model get 1 and 0
+        """
+        with open(filename, newline="", encoding="utf-8-sig") as f:
+            rows = [(int(row["beacon"]), float(row["coefficient"]), float(row["constant"])) for row in csv.DictReader(f)]
+
+        size = max([beacon for beacon, _, _ in rows], default=-1) + 1
+        coefficient = [1.0] * size
+        constant = [0.0] * size
+        for beacon, a, b in rows:
+            coefficient[beacon] = a
+            constant[beacon] = b
+        return coefficient, constant
+
+    def get(self, param, beacon):
+        """
+        Gets the correction model for one beacon
+
+        Parameters
+        ----------
+        param : str
+            short name of the parameter, e.g. "co2" or "pm2p5_mass"
+        beacon : int or str
+            number assigned to the beacon
+
+        Returns
+        -------
+        coefficient, constant : float
+            1 and 0 if there is no model for the parameter/beacon
+        """
+        self.refresh()
+        model = self.models.get(param.lower())
+        beacon = int(beacon)
+        if model is None or not 0 <= beacon < len(model[0]):
+            return 1.0, 0.0
+        return model[0][beacon], model[1][beacon]
+
+    def apply(self, param, values, beacon):
+        """
+        Corrects raw measurements
+
+        Parameters
+        ----------
+        param : str
+            short name of the parameter, e.g. "co2" or "pm2p5_mass"
+        values : float, np.ndarray, or Series
+            raw measurements
+        beacon : int or str
+            number assigned to the beacon
+
+        Returns
+        -------
+        <corrected> : same type as values
+            measurements after the linear correction
+        """
+        coefficient, constant = self.get(param, beacon)
+        return values * coefficient + constant
+
+    def tables(self, params, size=0):
+        """
+        Gets the correction models of several parameters side by side
+
+        Parameters
+        ----------
+        params : list of str
+            short names of the parameters
+        size : int, default 0
+            minimum number of beacons (rows) in the tables
+
+        Returns
+        -------
+        coefficient, constant : np.ndarray
+            arrays of shape (beacons, parameters) - 1 and 0 where there is no model
+        """
+        import numpy as np
+
+        self.refresh()
+        models = [self.models.get(param.lower()) for param in params]
+        size = max([size] + [len(model[0]) for model in models if model is not None])
+
+        coefficient = np.ones((size, len(params)))
+        constant = np.zeros((size, len(params)))
+        for j, model in enumerate(models):
+            if model is not None:
+                coefficient[:len(model[0]), j] = model[0]
+                constant[:len(model[1]), j] = model[1]
+        return coefficient, constant
+
+    def apply_many(self, params, values, beacons, chunk_size=65536):
+        """
+        Corrects several parameters at once
+
+        Parameters
+        ----------
+        params : list of str
+            short names of the parameters in column order
+        values : np.ndarray
+            raw measurements of shape (rows, parameters)
+        beacons : int, str, or np.ndarray
+            number assigned to the beacon, or the beacon number of each row
+        chunk_size : int, default 65536
+            number of rows corrected at a time when the beacon varies by row, which
+            bounds the size of the temporary coefficient/constant arrays
+
+        Returns
+        -------
+        corrected : np.ndarray
+            measurements after the linear corrections
+        """
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        beacons = np.asarray(beacons).astype(int)
+
+        if beacons.ndim == 0:
+            coefficient, constant = self.tables(params, int(beacons) + 1)
+            return values * coefficient[beacons] + constant[beacons]
+
+        coefficient, constant = self.tables(params, int(beacons.max(initial=0)) + 1)
+        corrected = np.empty_like(values)
+        for start in range(0, len(values), chunk_size):
+            rows = slice(start, start + chunk_size)
+            np.multiply(values[rows], coefficient[beacons[rows]], out=corrected[rows])
+            corrected[rows] += constant[beacons[rows]]
+        return corrected
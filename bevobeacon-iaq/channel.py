@@ -0,0 +1,152 @@
+"""Latest Reading Channel
+
+This script shares the most recent row of measurements between the sensor service
+and the display service through a memory-mapped file in /dev/shm so the display
+does not have to read the data files on the SD card.
+
+The segment starts with a sequence number that the publisher makes odd while it
+writes and even once the row is complete (a seqlock). Readers retry until they
+see the same even number before and after copying the row.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+
+MAGIC = b"BEVOSHM1"
+# magic | uint64 sequence | uint32 payload length | JSON payload
+HEADER = struct.Struct("<8sQI")
+SEQUENCE_OFFSET = len(MAGIC)
+DEFAULT_PATH = "/dev/shm/bevobeacon-latest" if os.path.isdir("/dev/shm") else "/tmp/bevobeacon-latest"
+
+
+class LatestReadingPublisher:
+
+    def __init__(self, path=DEFAULT_PATH, size=8192) -> None:
+        """
+        Parameters
+        ----------
+        path : str, default "/dev/shm/bevobeacon-latest"
+            location of the shared segment
+        size : int, default 8192
+            number of bytes in the segment
+        """
+        self.path = path
+        self.size = size
+
+        # reuse an existing segment so readers that already mapped it keep seeing updates
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        if self.mm[:len(MAGIC)] != MAGIC:
+            HEADER.pack_into(self.mm, 0, MAGIC, 0, 0)
+        self.sequence = HEADER.unpack_from(self.mm, 0)[1]
+        if self.sequence % 2:
+            # a previous publisher stopped part way through a write
+            self.sequence += 1
+
+    def publish(self, beacon, row):
+        """
+        Replaces the shared row
+
+        Parameters
+        ----------
+        beacon : str
+            number assigned to the beacon
+        row : dict
+            measurements indexed by column name with the time under "Timestamp"
+        """
+        payload = json.dumps({"beacon": beacon, "row": row}).encode("utf-8")
+        if HEADER.size + len(payload) > self.size:
+            raise ValueError(f"Row of {len(payload)} bytes does not fit in {self.path}")
+
+        struct.pack_into("<Q", self.mm, SEQUENCE_OFFSET, self.sequence + 1)
+        self.mm[HEADER.size:HEADER.size + len(payload)] = payload
+        struct.pack_into("<I", self.mm, SEQUENCE_OFFSET + 8, len(payload))
+        self.sequence += 2
+        struct.pack_into("<Q", self.mm, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        self.mm.close()
+
+
+class LatestReadingSubscriber:
+
+    def __init__(self, path=DEFAULT_PATH) -> None:
+        """
+        Parameters
+        ----------
+        path : str, default "/dev/shm/bevobeacon-latest"
+            location of the shared segment
+        """
+        self.path = path
+        self.mm = None
+        self.sequence = None
+        self.latest = None
+
+    def open(self):
+        """Maps the segment if the sensor service has created it"""
+        try:
+            with open(self.path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.mm = None
+            return False
+        if self.mm[:len(MAGIC)] != MAGIC:
+            self.mm.close()
+            self.mm = None
+            return False
+        return True
+
+    def read(self, retries=100):
+        """
+        Gets the latest row published by the sensor service
+
+        Parameters
+        ----------
+        retries : int, default 100
+            number of attempts made while the publisher is writing
+
+        Returns
+        -------
+        latest : tuple or None
+            beacon number and the row of measurements, None if nothing has been
+            published yet or no consistent copy could be taken
+        """
+        if self.mm is None and not self.open():
+            return None
+
+        for _ in range(retries):
+            _, before, length = HEADER.unpack_from(self.mm, 0)
+            if before == 0:
+                return None
+            if before % 2:
+                time.sleep(0)
+                continue
+            if before == self.sequence:
+                return self.latest
+
+            payload = self.mm[HEADER.size:HEADER.size + length]
+            if struct.unpack_from("<Q", self.mm, SEQUENCE_OFFSET)[0] != before:
+                continue
+
+            try:
+                message = json.loads(payload)
+            except ValueError:
+                continue
+            self.sequence = before
+            self.latest = (message["beacon"], message["row"])
+            return self.latest
+
+        return None
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
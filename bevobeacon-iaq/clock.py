@@ -0,0 +1,117 @@
+"""Clocks
+
+This script provides the clock the measurement loop runs on. The beacon uses the
+wall clock; simulations use an accelerated clock so a day of one-minute cycles
+can be run in minutes on a development machine, and tests use a fake clock that
+only moves when told to.
+
+Each clock has a wall time (now/time), which can jump when NTP syncs after boot,
+and a monotonic time, which never jumps and is what waits are scheduled on.
+"""
+import time
+import asyncio
+import datetime
+
+
+class Clock:
+    """Wall-clock time"""
+
+    speed = 1.0
+
+    def now(self):
+        """Gets the current local time as a datetime"""
+        return datetime.datetime.now()
+
+    def time(self):
+        """Gets the current time in seconds since the epoch"""
+        return time.time()
+
+    def monotonic(self):
+        """Gets the seconds since an arbitrary point - unaffected by changes to the wall clock"""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """Blocks for the given number of (clock) seconds"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def asleep(self, seconds):
+        """Waits for the given number of (clock) seconds without blocking the event loop"""
+        await asyncio.sleep(max(seconds, 0))
+
+
+class AcceleratedClock(Clock):
+
+    def __init__(self, speed, start=None) -> None:
+        """
+        Clock that runs faster than real time
+
+        Parameters
+        ----------
+        speed : float
+            clock seconds per real second, e.g. 100 to run a one-minute cycle every 0.6 s
+        start : datetime.datetime, default None
+            time the clock starts from - the current time if not provided
+        """
+        self.speed = speed
+        self.start = datetime.datetime.now() if start is None else start
+        self.start_monotonic = time.monotonic()
+
+    def now(self):
+        return self.start + datetime.timedelta(seconds=self.monotonic())
+
+    def time(self):
+        return self.now().timestamp()
+
+    def monotonic(self):
+        return (time.monotonic() - self.start_monotonic) * self.speed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    async def asleep(self, seconds):
+        await asyncio.sleep(max(seconds, 0) / self.speed)
+
+
+class FakeClock(Clock):
+
+    def __init__(self, start=None) -> None:
+        """
+        Clock that only moves when it is advanced or slept on - for tests
+
+        Parameters
+        ----------
+        start : datetime.datetime, default None
+            wall time the clock starts from - 2021-01-01 00:00 if not provided
+        """
+        start = datetime.datetime(2021, 1, 1) if start is None else start
+        self.wall = start.timestamp()
+        self.elapsed = 0.0
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.wall)
+
+    def time(self):
+        return self.wall
+
+    def monotonic(self):
+        return self.elapsed
+
+    def advance(self, seconds):
+        """Moves both the wall and monotonic time forward, e.g. to simulate a slow cycle"""
+        self.wall += seconds
+        self.elapsed += seconds
+
+    def jump(self, seconds):
+        """Moves only the wall time, e.g. to simulate an NTP correction"""
+        self.wall += seconds
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance(seconds)
+
+    async def asleep(self, seconds):
+        if seconds > 0:
+            self.advance(seconds)
+        await asyncio.sleep(0)
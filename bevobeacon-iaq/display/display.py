@@ -9,6 +9,7 @@ Project: BEVO Beacon IAQ
 """
 
 import os
+import sys
 import glob
 import logging
 import pathlib
@@ -17,12 +18,25 @@ import argparse
 import board
 import busio as io
 
-import pandas as pd
-import numpy as np
+import math
 import time
 
 from oled_text import OledText, BigLine, SmallLine
 
+# modules shared with the sensor service live one directory up
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from storage import LatestRowReader
+from channel import LatestReadingSubscriber, DEFAULT_PATH as LATEST_READING_PATH
+from calibration import CorrectionRegistry
+
+# correction models are loaded once and reloaded when the files change
+corrections = CorrectionRegistry()
+
+# latest row shared in memory by the sensor service
+latest_reading = LatestReadingSubscriber(os.environ.get("LATEST_READING_PATH", LATEST_READING_PATH))
+# keeps the header and latest row of the data file between refreshes
+latest_row_reader = LatestRowReader()
+
 def get_measurements(variables,path_to_data="/home/pi/DATA"):
     """
     Gets the latest measurements from the data file
@@ -45,39 +59,32 @@ def get_measurements(variables,path_to_data="/home/pi/DATA"):
     """
     # logging instance
     logger = setup_logging("get_measurements",level=logging.ERROR)
-    # getting newest file
-    file_list = glob.glob(f"{path_to_data}/*.csv")
-    newest_file = max(file_list, key=os.path.getctime)
-    logger.info(f"Reading from {newest_file}")
-    beacon = int(newest_file.split("/")[-1][1:3])
-    # reading in file
-    df = pd.read_csv(f"{newest_file}",index_col=0)
+    shared = latest_reading.read()
+    if shared is not None:
+        logger.info(f"Reading from {latest_reading.path}")
+        beacon = int(shared[0])
+        latest = shared[1]
+    else:
+        # getting newest file
+        file_list = glob.glob(f"{path_to_data}/*.csv") + glob.glob(f"{path_to_data}/*.bin")
+        newest_file = max(file_list, key=os.path.getctime)
+        logger.info(f"Reading from {newest_file}")
+        beacon = int(newest_file.split("/")[-1][1:3])
+        # reading in the last row of the file
+        latest = latest_row_reader.read(newest_file) or {}
     # getting important var measurements
     measurements = []
     for v in variables:
         try:
-            value = df.loc[:,v].values[-1]
+            value = latest[v]
             # correcting the value 
-            corrected = False
-            path_to_correction = "/home/pi/bevo_iaq/bevobeacon-iaq/correction/"
-            if os.path.exists(path_to_correction):
-                for file in os.listdir(path_to_correction):
-                    file_info = file.split("-")
-                    short_name = get_short_name(v.split('-')[0])
-                    if file_info[0] == short_name:
-                        logger.warning(f"Found correction file for {short_name}")
-                        correction = pd.read_csv(f"{path_to_correction}{file}",index_col=0)
-                        corrected = True
-                        break
-
-            if corrected is False:
+            short_name = get_short_name(v.split('-')[0])
+            if short_name not in corrections.models:
                 logger.warning(f"No correction file for {v} (looked for {short_name})")
-                correction = pd.DataFrame(data={"beacon":np.arange(0,51),"constant":np.zeros(51),"coefficient":np.ones(51)}).set_index("beacon")
-                
-            value = value * correction.loc[beacon,"coefficient"] + correction.loc[beacon,"constant"]
+            value = corrections.apply(short_name, value, beacon)
         except KeyError:
             logger.exception(f"Check parameter name: {v}")
-            value = np.nan
+            value = math.nan
             
         measurements.append(round(value,1))
 
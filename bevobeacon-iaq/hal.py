@@ -0,0 +1,304 @@
+"""Sensor Backends
+
+This script creates the sensor objects used by the scan loop from one of several
+backends so the pipeline can run off the beacon:
+
+- real: the drivers for the SGP30, TSL2591, SPS30, SCD30 and SPEC DGS sensors
+- simulated: sensors that generate realistic signals (daily cycle plus noise) with
+  configurable latency and error rates
+- replay: sensors that play back the measurements stored in existing data files
+
+Every backend provides the same interface as the drivers - a blocking ``read``
+method, ``bus`` and ``columns`` attributes, and ``enable``/``disable`` where the
+real sensor has them. Other backends can be added with ``register_backend``.
+"""
+import os
+import glob
+import math
+import random
+import logging
+
+from storage import read_rows
+from clock import Clock
+from i2c_bus import I2CBus, ADDRESSES
+from sensor_specs import SENSORS, TIMING
+
+log = logging.getLogger(__name__)
+
+# sensors turned on and off around each scan cycle to save power
+MANUALLY_ENABLED = ("tsl", "sps", "scd")
+
+# approximate duration in seconds of one read of each real sensor
+LATENCY = {"sgp": 0.02, "tsl": 0.11, "sps": 0.02, "scd": 0.02, "dgs_co": 0.12, "dgs_no2": 0.12}
+
+# baseline, daily amplitude, and noise of the simulated signals
+SIGNALS = {
+    "total_volatile_organic_compounds-ppb": (150, 100, 15),
+    "equivalent_carbon_dioxide-ppm": (550, 200, 20),
+    "visible-unitless": (2000, 2000, 50),
+    "infrared-unitless": (600, 500, 20),
+    "light-lux": (150, 150, 5),
+    "pm0p5_count-number_per_cm3": (8, 4, 1),
+    "pm1_count-number_per_cm3": (9, 4, 1),
+    "pm2p5_count-number_per_cm3": (9.5, 4, 1),
+    "pm4_count-number_per_cm3": (9.6, 4, 1),
+    "pm10_count-number_per_cm3": (9.7, 4, 1),
+    "pm1_mass-microgram_per_m3": (4, 2, 0.5),
+    "pm2p5_mass-microgram_per_m3": (5, 3, 0.5),
+    "pm4_mass-microgram_per_m3": (5.5, 3, 0.5),
+    "pm10_mass-microgram_per_m3": (6, 3, 0.5),
+    "carbon_dioxide-ppm": (650, 250, 15),
+    "t_from_co2-c": (23.5, 1.5, 0.1),
+    "rh_from_co2-percent": (45, 5, 0.5),
+    "carbon_monoxide-ppb": (400, 200, 50),
+    "t_from_co-c": (24, 1.5, 0.1),
+    "rh_from_co-percent": (44, 5, 0.5),
+    "nitrogen_dioxide-ppb": (20, 10, 5),
+    "t_from_no2-c": (24, 1.5, 0.1),
+    "rh_from_no2-percent": (44, 5, 0.5),
+}
+
+BACKENDS = {}
+
+
+def register_backend(name):
+    """
+    Decorator that adds a backend - a function that takes the sensor names and the
+    backend's options and returns the sensor objects indexed by name
+    """
+    def decorator(fxn):
+        BACKENDS[name] = fxn
+        return fxn
+    return decorator
+
+
+def create_sensors(backend="real", names=None, **options):
+    """
+    Creates the sensors that are available on the given backend
+
+    Parameters
+    ----------
+    backend : str, default "real"
+        "real", "simulated", "replay", or another registered backend
+    names : list of str, default None
+        sensors to create - all of SENSORS if not provided
+    **options
+        settings passed to the backend, e.g. latency and error_rate for the
+        simulated sensors or data_dir for replay
+
+    Returns
+    -------
+    sensors : dict
+        sensor objects indexed by name - sensors that could not be created are left out
+    """
+    try:
+        factory = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown sensor backend: {backend} (available: {', '.join(BACKENDS)})")
+    return factory(list(names or SENSORS), **options)
+
+
+def create_each(names, fxn):
+    """Creates each sensor with fxn(name), leaving out sensors that cannot be created"""
+    sensors = {}
+    for name in names:
+        try:
+            sensors[name] = fxn(name)
+        except Exception as e:
+            log.warning(f"Could not create {name}: {e}")
+    return sensors
+
+
+def real_sensor(name, dgs_connection="reopen", i2c=None):
+    """Creates the driver for a physical sensor"""
+    if name in ("sgp", "tsl"):
+        from adafruit import SGP30, TSL2591
+        return {"sgp": SGP30, "tsl": TSL2591}[name](i2c)
+    elif name in ("sps", "scd"):
+        from sensirion import SPS30, SCD30
+        return {"sps": SPS30, "scd": SCD30}[name](i2c)
+    elif name in ("dgs_co", "dgs_no2"):
+        from spec_dgs import DGS_CO, DGS_NO2
+        return {"dgs_co": DGS_CO, "dgs_no2": DGS_NO2}[name](connection=dgs_connection)
+    raise ValueError(f"Unknown sensor: {name}")
+
+
+@register_backend("real")
+def real_sensors(names, dgs_connection="reopen", i2c=None):
+    """Creates the drivers of the sensors that are connected - see spec_dgs for the DGS connections"""
+    # the I2C sensors share one bus
+    i2c = I2CBus() if i2c is None else i2c
+    return create_each(names, lambda name: real_sensor(name, dgs_connection, i2c))
+
+
+class SimulatedSensor:
+
+    def __init__(self, name, latency=None, error_rate=0.0, clock=None, seed=None, i2c=None) -> None:
+        """
+        Parameters
+        ----------
+        name : str
+            sensor to simulate - one of SENSORS
+        latency : float, default None
+            seconds each read blocks for - the real sensor's approximate latency if not provided
+        error_rate : float, default 0.0
+            share of reads that fail and return NaN like the drivers do
+        clock : Clock, default None
+            time source - the daily cycle follows its wall time and the latency and
+            waits for data are slept on it, so an accelerated clock speeds them up
+            too; the wall clock if not provided
+        seed : int, default None
+            seed for the noise and errors
+        i2c : I2CBus, default None
+            bus (e.g. on a FakeI2C) the sensor makes a transaction on whenever the
+            real one would - the read latency is spent holding the bus
+        """
+        self.name = name
+        self.bus, self.columns = SENSORS[name]
+        self.latency = LATENCY[name] if latency is None else latency
+        self.warmup, self.sample_interval = TIMING[name]
+        self.error_rate = error_rate
+        self.clock = Clock() if clock is None else clock
+        self.random = random.Random(seed)
+        self.enabled = name not in MANUALLY_ENABLED
+        self.enabled_at = self.clock.time()
+        self.last_sample = -1
+        self.i2c = i2c
+
+    def transfer(self, size=3, latency=0.0):
+        """Makes one transaction on the bus if the sensor has one, otherwise just takes the time"""
+        if self.i2c is None:
+            self.clock.sleep(latency)
+            return
+
+        def transaction():
+            self.i2c.handle.writeto_then_readfrom(ADDRESSES[self.name], bytes(2), bytearray(size))
+            self.clock.sleep(latency)
+
+        self.i2c.transaction(self.name, transaction)
+
+    def enable(self):
+        self.transfer()
+        self.enabled = True
+        self.enabled_at = self.clock.time()
+        self.last_sample = -1
+
+    def disable(self):
+        self.transfer()
+        self.enabled = False
+
+    def sample_number(self):
+        """Gets the number of samples produced since the sensor was enabled - -1 while warming up"""
+        elapsed = self.clock.time() - self.enabled_at - self.warmup
+        if elapsed < 0:
+            return -1
+        return int(elapsed // self.sample_interval) if self.sample_interval else 0
+
+    def data_ready(self):
+        try:
+            self.transfer()
+        except OSError:
+            return False
+        number = self.sample_number()
+        # sensors without a sample interval have new data on every read once warmed up
+        return self.enabled and number >= 0 and (not self.sample_interval or number > self.last_sample)
+
+    def read(self):
+        # like the drivers, wait a little for new data but not indefinitely
+        attempts = 0
+        while self.sample_interval and not self.data_ready() and attempts <= 3:
+            self.clock.sleep(0.1)
+            attempts += 1
+        self.last_sample = self.sample_number()
+        try:
+            self.transfer(3 * len(self.columns), self.latency)
+        except OSError:
+            return {column: math.nan for column in self.columns}
+        if self.random.random() < self.error_rate:
+            return {column: math.nan for column in self.columns}
+
+        # peaks in the afternoon and dips at night
+        phase = math.sin(2 * math.pi * ((self.clock.time() / 86400) % 1 - 0.375))
+        data = {}
+        for column in self.columns:
+            base, amplitude, noise = SIGNALS.get(column, (0, 0, 1))
+            data[column] = max(0.0, base + amplitude * phase + self.random.gauss(0, noise))
+        return data
+
+
+@register_backend("simulated")
+def simulated_sensors(names, seed=None, i2c=None, **options):
+    """Creates sensors that generate their measurements - the I2C ones on the i2c bus if given"""
+    rng = random.Random(seed)
+    return create_each(names, lambda name: SimulatedSensor(
+        name, seed=rng.getrandbits(32), i2c=i2c if SENSORS[name][0] == "i2c" else None, **options
+    ))
+
+
+class ReplaySource:
+
+    def __init__(self, data_dir, pattern="*", period=60, clock=None) -> None:
+        """
+        Plays back the rows of existing data files as time passes
+
+        Parameters
+        ----------
+        data_dir : str
+            location of the csv or binary data files
+        pattern : str, default "*"
+            file names to play back (without the extension), e.g. "b05_2021-*"
+        period : float, default 60
+            seconds between rows
+        clock : Clock, default None
+            time source the playback follows - the wall clock if not provided
+
+        Creates
+        -------
+        rows : list of dict
+            measurements of every file in date order - the playback loops around
+        """
+        paths = sorted(glob.glob(os.path.join(data_dir, f"{pattern}.csv")) + glob.glob(os.path.join(data_dir, f"{pattern}.bin")))
+        self.rows = [row for path in paths for row in read_rows(path)]
+        if not self.rows:
+            raise ValueError(f"No data files to replay in {data_dir}")
+
+        self.period = period
+        self.clock = Clock() if clock is None else clock
+        self.start = self.clock.time()
+
+    def current(self):
+        """Gets the row for the current time"""
+        return self.rows[int((self.clock.time() - self.start) // self.period) % len(self.rows)]
+
+
+class ReplaySensor:
+
+    def __init__(self, name, source) -> None:
+        """
+        Parameters
+        ----------
+        name : str
+            sensor to play back - one of SENSORS
+        source : ReplaySource
+            rows shared by the replayed sensors
+        """
+        self.name = name
+        self.bus, self.columns = SENSORS[name]
+        self.source = source
+
+    def enable(self):
+        pass
+
+    def disable(self):
+        pass
+
+    def read(self):
+        row = self.source.current()
+        return {column: row.get(column, math.nan) for column in self.columns}
+
+
+@register_backend("replay")
+def replay_sensors(names, data_dir, **options):
+    """Creates sensors that play back the data files in data_dir"""
+    source = ReplaySource(data_dir, **options)
+    return create_each(names, lambda name: ReplaySensor(name, source))
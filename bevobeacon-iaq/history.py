@@ -0,0 +1,309 @@
+"""Recent History
+
+This script keeps the most recent rows of measurements (by default a day of
+one-minute cycles) in memory so on-device features can use recent data without
+going back to the data files. The rows live in arrays that are allocated once,
+with one slot per cycle, and the oldest row is overwritten by each new one.
+
+Rolling statistics are kept for several windows (by default 5 minutes, 1 hour
+and 24 hours) and updated as each row is added: the sums and counts behind the
+means by adding the new row and removing the one leaving the window, and the
+minimum and maximum by comparing with the new row - a column is only searched
+again when the row leaving the window held its minimum or maximum. Missing
+measurements (NaN) are left out of the statistics.
+"""
+import math
+import logging
+import datetime
+
+log = logging.getLogger(__name__)
+
+# seconds covered by the rolling statistics
+WINDOWS = (300, 3600, 86400)
+
+
+class RollingWindow:
+
+    def __init__(self, rows, width) -> None:
+        """
+        Parameters
+        ----------
+        rows : int
+            number of most recent rows the statistics cover
+        width : int
+            number of columns
+
+        Creates
+        -------
+        sums, counts : np.ndarray
+            sum and number of the valid measurements of each column in the window
+        minimum, maximum : np.ndarray
+            smallest and largest valid measurement of each column in the window
+        """
+        import numpy as np
+
+        self.rows = rows
+        self.sums = np.zeros(width)
+        self.counts = np.zeros(width, dtype=np.int64)
+        self.minimum = np.full(width, np.nan)
+        self.maximum = np.full(width, np.nan)
+
+
+class History:
+
+    def __init__(self, columns, capacity=1440, period=60.0, windows=WINDOWS) -> None:
+        """
+        Parameters
+        ----------
+        columns : list of str
+            names of the measurements in the order of the rows
+        capacity : int, default 1440
+            number of rows kept - a day of one-minute cycles by default
+        period : float, default 60.0
+            seconds between rows - missing cycles are kept as rows of NaN
+        windows : tuple of float, default WINDOWS
+            seconds covered by each set of rolling statistics - a window shorter than
+            one period covers the latest row and one longer than capacity * period
+            covers every row
+
+        Creates
+        -------
+        timestamps : np.ndarray
+            time of each row in seconds since the epoch - NaN for unused slots
+        values : np.ndarray
+            measurements with one row per cycle and one column per measurement
+        windows : dict of RollingWindow
+            rolling statistics indexed by the seconds they cover
+        """
+        import numpy as np
+
+        self.columns = list(columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self.capacity = capacity
+        self.period = period
+        width = len(self.columns)
+
+        self.timestamps = np.full(capacity, np.nan)
+        self.values = np.full((capacity, width), np.nan)
+        self.windows = {}
+        for seconds in windows:
+            rows = min(max(int(round(seconds / period)), 1), capacity)
+            if rows * period != seconds:
+                log.info(f"Window of {seconds} s covers {rows} row(s) of {period} s")
+            self.windows[seconds] = RollingWindow(rows, width)
+
+        # scratch space so adding a row does not allocate
+        self.evicted = np.full(width, np.nan)
+        self.filled = np.zeros(width)
+        self.valid = np.zeros(width, dtype=bool)
+        self.stale = np.zeros(width, dtype=bool)
+
+        self.count = 0
+        self.slot = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def span(self):
+        """Seconds of history the store holds when full"""
+        return self.capacity * self.period
+
+    def clear(self):
+        """Forgets every row"""
+        for window in self.windows.values():
+            window.sums.fill(0)
+            window.counts.fill(0)
+            window.minimum.fill(math.nan)
+            window.maximum.fill(math.nan)
+        self.timestamps.fill(math.nan)
+        self.values.fill(math.nan)
+        self.count = 0
+        self.slot = None
+
+    def append(self, timestamp, row):
+        """
+        Adds the row of a cycle
+
+        Parameters
+        ----------
+        timestamp : float or datetime.datetime
+            time of the cycle (seconds since the epoch if a number)
+        row : sequence of float
+            measurements in the order of the columns
+        """
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = timestamp.timestamp()
+        slot = math.floor(timestamp / self.period)
+        if self.slot is not None:
+            missed = slot - self.slot - 1
+            if missed >= self.capacity:
+                self.clear()
+            elif missed > 0:
+                # keep the rows one period apart so the windows cover the right time
+                for i in range(missed):
+                    self.put((self.slot + 1 + i) * self.period, None)
+            elif missed < 0:
+                log.debug(f"Row at {timestamp} is not after the previous row - added as the next one")
+        self.put(timestamp, row)
+        self.slot = slot if self.slot is None or slot > self.slot else self.slot + 1
+
+    def put(self, timestamp, row):
+        """Writes a row (NaN if None) over the oldest one and updates the rolling statistics"""
+        import numpy as np
+
+        position = self.count % self.capacity
+        self.evicted[:] = self.values[position]
+        if row is None:
+            self.values[position] = np.nan
+        else:
+            self.values[position] = row
+        self.timestamps[position] = timestamp
+        self.count += 1
+        new = self.values[position]
+
+        for window in self.windows.values():
+            # the row leaving this window - for the full buffer the one just overwritten
+            if window.rows == self.capacity:
+                leaving = self.evicted
+            elif self.count > window.rows:
+                leaving = self.values[(position - window.rows) % self.capacity]
+            else:
+                leaving = None
+
+            np.isnan(new, out=self.valid)
+            np.logical_not(self.valid, out=self.valid)
+            np.copyto(self.filled, 0.0)
+            np.copyto(self.filled, new, where=self.valid)
+            window.sums += self.filled
+            window.counts += self.valid
+            np.fmin(window.minimum, new, out=window.minimum)
+            np.fmax(window.maximum, new, out=window.maximum)
+
+            if leaving is not None:
+                np.isnan(leaving, out=self.valid)
+                np.logical_not(self.valid, out=self.valid)
+                np.copyto(self.filled, 0.0)
+                np.copyto(self.filled, leaving, where=self.valid)
+                window.sums -= self.filled
+                window.counts -= self.valid
+
+                np.equal(leaving, window.minimum, out=self.stale)
+                if self.stale.any():
+                    window.minimum[self.stale] = self.search(np.fmin, window.rows, self.stale)
+                np.equal(leaving, window.maximum, out=self.stale)
+                if self.stale.any():
+                    window.maximum[self.stale] = self.search(np.fmax, window.rows, self.stale)
+
+            if self.count % self.capacity == 0:
+                # start over from the stored rows once in a while so rounding errors do not build up
+                rows = self.rows(window.rows)
+                window.counts[:] = np.count_nonzero(~np.isnan(rows), axis=0)
+                window.sums[:] = np.nansum(rows, axis=0)
+
+    def pieces(self, count):
+        """Gets the most recent rows as one or two views of the buffer (oldest first)"""
+        count = min(count, len(self))
+        end = self.count % self.capacity or (self.capacity if self.count else 0)
+        if count <= end:
+            return [self.values[end - count:end]]
+        return [self.values[end - count:], self.values[:end]]
+
+    def search(self, ufunc, count, columns):
+        """Reduces some columns of the most recent rows with np.fmin or np.fmax"""
+        pieces = [ufunc.reduce(piece[:, columns], axis=0) for piece in self.pieces(count)]
+        return pieces[0] if len(pieces) == 1 else ufunc(*pieces)
+
+    def rows(self, count):
+        """
+        Gets the most recent rows in order
+
+        Parameters
+        ----------
+        count : int
+            number of rows - limited to the number stored
+
+        Returns
+        -------
+        values : np.ndarray
+            measurements from oldest to newest - a view when the rows are stored
+            in one piece, otherwise a copy
+        """
+        import numpy as np
+
+        pieces = self.pieces(count)
+        return pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+
+    def latest(self):
+        """
+        Gets the most recent row
+
+        Returns
+        -------
+        timestamp : float
+            time of the row in seconds since the epoch - NaN if there are no rows
+        values : dict
+            measurements indexed by column
+        """
+        if not self.count:
+            return math.nan, {column: math.nan for column in self.columns}
+        position = (self.count - 1) % self.capacity
+        return float(self.timestamps[position]), dict(zip(self.columns, self.values[position].tolist()))
+
+    def latest_value(self, column):
+        """Gets the most recent measurement of a column - NaN if there are no rows"""
+        if not self.count:
+            return math.nan
+        return float(self.values[(self.count - 1) % self.capacity, self.index[column]])
+
+    def statistics(self, seconds):
+        """
+        Gets the rolling statistics of a window
+
+        Parameters
+        ----------
+        seconds : float
+            one of the windows the store was created with
+
+        Returns
+        -------
+        statistics : dict of dict
+            "mean", "min", "max", and "count" of the valid measurements in the window
+            indexed by column - NaN for columns without any
+        """
+        window = self.windows[seconds]
+        statistics = {}
+        for i, column in enumerate(self.columns):
+            count = int(window.counts[i])
+            statistics[column] = {
+                "mean": float(window.sums[i]) / count if count else math.nan,
+                "min": float(window.minimum[i]),
+                "max": float(window.maximum[i]),
+                "count": count,
+            }
+        return statistics
+
+    def add_rows(self, rows, since=None, until=None):
+        """
+        Adds rows read from a data file, e.g. to restore the history after a restart
+
+        Parameters
+        ----------
+        rows : iterable of dict
+            measurements indexed by column with the time under "Timestamp" - see
+            storage.read_rows
+        since : float, default None
+            seconds since the epoch before which rows are skipped
+        until : float, default None
+            seconds since the epoch from which rows are skipped, e.g. the cycle about
+            to be appended
+        """
+        for row in rows:
+            timestamp = datetime.datetime.strptime(row["Timestamp"], "%Y-%m-%d %H:%M:%S").timestamp()
+            if since is not None and timestamp < since:
+                continue
+            if until is not None and timestamp >= until:
+                continue
+            if self.slot is not None and math.floor(timestamp / self.period) <= self.slot:
+                continue
+            self.append(timestamp, [row.get(column, math.nan) for column in self.columns])
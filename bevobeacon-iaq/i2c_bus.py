@@ -0,0 +1,190 @@
+"""I2C Bus
+
+This script coordinates the sensors that share the beacon's I2C bus (SGP30,
+TSL2591, SPS30 and SCD30). One bus object owns the handle and every transaction
+a driver makes goes through it, under a single lock, so a read started by the
+scan worker cannot be interleaved with, e.g., a sensor being enabled from the
+event loop. Several operations on one device can be run as a batch under one
+lock acquisition. The duration and failures of every transaction are recorded
+per device.
+
+The Adafruit drivers use the bus's busio handle. The Sensirion packages open
+their own descriptors on /dev/i2c-1, but their transactions are serialized by
+the same lock.
+
+A fake bus with per-transfer latency and errors, which detects overlapping
+transfers, stands in for the hardware off the beacon.
+"""
+import time
+import random
+import threading
+
+from metrics import Metrics
+
+# 7-bit address of each sensor on the bus
+ADDRESSES = {"sgp": 0x58, "tsl": 0x29, "sps": 0x69, "scd": 0x61}
+
+
+class I2CBus:
+
+    def __init__(self, handle=None, lock=None) -> None:
+        """
+        Parameters
+        ----------
+        handle : busio.I2C or FakeI2C, default None
+            the bus - the board's SCL/SDA pins are opened when first needed if not provided
+        lock : context manager, default None
+            held for every transaction - a new reentrant lock if not provided
+
+        Creates
+        -------
+        metrics : Metrics
+            recent transaction durations ("i2c_transaction") and failures
+            ("i2c_errors_total") labelled by device - only updated while holding the lock
+        transactions : dict
+            number of transactions indexed by device
+        errors : dict
+            number of failed transactions indexed by device
+        """
+        self._handle = handle
+        self.lock = threading.RLock() if lock is None else lock
+        self.metrics = Metrics()
+        self.transactions = {}
+        self.errors = {}
+
+    @property
+    def handle(self):
+        """Gets the busio handle shared by the drivers, opening the bus if needed"""
+        if self._handle is None:
+            # only available on the beacon
+            from board import SCL, SDA
+            from busio import I2C
+            self._handle = I2C(SCL, SDA)
+        return self._handle
+
+    def transaction(self, device, fxn, *args, **kwargs):
+        """
+        Runs one operation on a device while holding the bus
+
+        Parameters
+        ----------
+        device : str
+            sensor the operation talks to - the label of the statistics
+        fxn : callable
+            the operation, e.g. a driver method
+        *args, **kwargs
+            passed to fxn
+
+        Returns
+        -------
+        result
+            whatever fxn returns - its exceptions are counted and re-raised
+        """
+        return self.batch(device, lambda: fxn(*args, **kwargs))[0]
+
+    def batch(self, device, *fxns):
+        """
+        Runs several operations on a device back to back while holding the bus once
+
+        Returns
+        -------
+        results : list
+            what each operation returned - the first exception is counted and re-raised
+        """
+        with self.lock:
+            start_time = time.perf_counter()
+            try:
+                return [fxn() for fxn in fxns]
+            except Exception:
+                self.errors[device] = self.errors.get(device, 0) + 1
+                self.metrics.increment("i2c_errors_total", device=device)
+                raise
+            finally:
+                self.transactions[device] = self.transactions.get(device, 0) + 1
+                self.metrics.observe("i2c_transaction", time.perf_counter() - start_time, device=device)
+
+    def statistics(self):
+        """
+        Summarizes the transactions of every device
+
+        Returns
+        -------
+        statistics : dict of dict
+            number of transactions and errors plus the p50, p95 and max duration
+            in seconds of the recent transactions indexed by device
+        """
+        statistics = {}
+        with self.lock:
+            for device, count in sorted(self.transactions.items()):
+                histogram = self.metrics.stages[Metrics.key("i2c_transaction", {"device": device})]
+                statistics[device] = {
+                    "transactions": count,
+                    "errors": self.errors.get(device, 0),
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "max": histogram.maximum(),
+                }
+        return statistics
+
+
+class FakeI2C:
+
+    def __init__(self, latency=0.002, error_rate=0.0, seed=None) -> None:
+        """
+        Stand-in for busio.I2C that takes time per transfer and can fail
+
+        Parameters
+        ----------
+        latency : float, default 0.002
+            seconds every transfer blocks for
+        error_rate : float, default 0.0
+            share of transfers that fail with an OSError like a NACK does
+        seed : int, default None
+            seed for the errors
+
+        Creates
+        -------
+        transfers : int
+            number of transfers made
+        collisions : int
+            number of transfers that started while another was in progress - would
+            corrupt both on a real bus
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.transfers = 0
+        self.collisions = 0
+        self.active = 0
+        self.counter = threading.Lock()
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def scan(self):
+        return sorted(ADDRESSES.values())
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        """Writes a command and reads the response in one transfer - fills buffer_in with zeros"""
+        with self.counter:
+            self.transfers += 1
+            if self.active:
+                self.collisions += 1
+            self.active += 1
+            failed = self.random.random() < self.error_rate
+        time.sleep(self.latency)
+        with self.counter:
+            self.active -= 1
+        if failed:
+            raise OSError(121, f"Remote I/O error from 0x{address:02x}")
+        for i in range(len(buffer_in)):
+            buffer_in[i] = 0
+
+    def writeto(self, address, buffer, **kwargs):
+        self.writeto_then_readfrom(address, buffer, bytearray())
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        self.writeto_then_readfrom(address, b"", buffer)
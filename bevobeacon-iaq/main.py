@@ -16,17 +16,44 @@ import time
 import datetime
 import asyncio
 
-import pandas as pd
+from hal import create_sensors, MANUALLY_ENABLED
+from scanner import Scanner
+from aggregate import CycleAggregator
+from storage import DailyCsvWriter, DailyBinaryWriter, LatestRowReader, read_rows
+from channel import LatestReadingPublisher, DEFAULT_PATH as LATEST_READING_PATH
+from calibration import CorrectionRegistry
+from summary import SummaryAccumulator, save_summary
+from upload import S3Client, UploadQueue, IncrementalShipper, CODECS, zstandard
+from clock import Clock
+from scheduler import Scheduler
+from metrics import Metrics, DEFAULT_PATH as METRICS_PATH
+from i2c_bus import I2CBus, FakeI2C
+from history import History
+
+log = logging.getLogger(__name__)
+
+async def main(beacon = '00', clock=None, s3=None, max_cycles=None):
+    """
+    Measures, stores, and uploads the beacon's data every minute
 
-from adafruit import SGP30, TSL2591
-from sensirion import SPS30, SCD30
-from spec_dgs import DGS_NO2, DGS_CO
+    Parameters
+    ----------
+    beacon : str, default '00'
+        number assigned to the beacon
+    clock : Clock, default None
+        time source for timestamps and waits - the wall clock if not provided
+    s3 : S3 client, default None
+        client used for uploads - created from the AWS environment variables if not provided
+    max_cycles : int, default None
+        number of scan cycles to run before returning - runs until terminated if not provided
 
-# AWS libraries
-import boto3
-from botocore.exceptions import ClientError
+    Returns
+    -------
+    cycle_times : list of float
+        duration in seconds of each scan cycle (once max_cycles have run)
+    """
+    clock = Clock() if clock is None else clock
 
-async def main(beacon = '00'):
     # AWS credentials
     try:
         AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
@@ -39,163 +66,399 @@ async def main(beacon = '00'):
         AWS_SECRET_ACCESS_KEY = ""
         BUCKET_NAME = ""
 
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id = AWS_ACCESS_KEY_ID,
-        aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-    )
+    # boto3 is only imported once the first upload is made
+    if s3 is None and BUCKET_NAME:
+        s3 = S3Client(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
     # upload variables
-    S3_CALL_TIMESTAMP = datetime.datetime.now()
-    S3_CALL_FREQUENCY = datetime.timedelta(days=1)
+    S3_CALL_TIMESTAMP = clock.now()
+    S3_CALL_FREQUENCY = datetime.timedelta(hours=float(os.environ.get("S3_UPLOAD_HOURS", 24))) # between uploads of the day's file and summary
     S3_FILEPATH = f"B{beacon}/"
-   
-    sensor_classes = {
-        "sgp": SGP30,
-        "tsl": TSL2591,
-        "sps": SPS30,
-        "scd": SCD30,
-        "dgs_co": DGS_CO,
-        "dgs_no2": DGS_NO2,
-    }
-
-    sensors = {}
+    S3_CATCH_UP_DAYS = int(os.environ.get("S3_CATCH_UP_DAYS", 7)) # earlier days to upload if they were missed
+    # "daily" uploads the day's file once a day, "incremental" ships new rows as compressed chunks during the day
+    S3_UPLOAD_MODE = os.environ.get("S3_UPLOAD_MODE", "daily")
+    S3_CHUNK_TIMESTAMP = clock.now()
+    S3_CHUNK_FREQUENCY = datetime.timedelta(minutes=float(os.environ.get("S3_CHUNK_MINUTES", 15)))
+    S3_COMPACT_CHUNKS = os.environ.get("S3_COMPACT_CHUNKS", "1") == "1" # replace a finished day's chunks with the full file
+    # compression applied to uploads ("none", "gzip", "lzma", or "zstd") - stored as the object's Content-Encoding
+    S3_CODEC = os.environ.get("S3_CODEC", "none").lower()
+    if S3_CODEC == "zstd" and zstandard is None:
+        log.warning("zstandard is not installed - compressing uploads with gzip")
+        S3_CODEC = "gzip"
+    if S3_CODEC not in CODECS:
+        S3_CODEC = None
+
+    # storage variables - location of the data/summary files, file format ("csv" or "binary") and how often the data file is flushed/synced to the SD card
+    DATA_DIR = os.environ.get("DATA_DIR", "/home/pi/DATA")
+    SUMMARY_DIR = os.environ.get("SUMMARY_DIR", "/home/pi/summary_data/")
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "csv")
+    STORAGE_DTYPE = os.environ.get("STORAGE_DTYPE", "<f8")
+    CSV_FLUSH_ROWS = int(os.environ.get("CSV_FLUSH_ROWS", 1)) or None
+    CSV_FLUSH_SECONDS = float(os.environ.get("CSV_FLUSH_SECONDS", 0)) or None
+    CSV_FSYNC = os.environ.get("CSV_FSYNC", "0") == "1"
+
+    # metrics variables - file the stage timings are written to ("" to disable) and how many cycles between writes
+    METRICS_FILE = os.environ.get("METRICS_PATH", METRICS_PATH)
+    METRICS_INTERVAL = int(os.environ.get("METRICS_INTERVAL", 1))
+
+    # scheduling variables - seconds between cycles and how many missed cycles are run to catch up after an overrun
+    CYCLE_PERIOD = float(os.environ.get("CYCLE_PERIOD", 60))
+    CYCLE_CATCH_UP = int(os.environ.get("CYCLE_CATCH_UP", 0))
+
+    # scanning variables - "fixed" waits 0.5 s after enabling the sensors, "ready" samples each sensor as soon as it has data
+    SCAN_MODE = os.environ.get("SCAN_MODE", "fixed")
+    # In "ready" mode every sensor gives all five samples by default, which keeps the SCD30 on for about 10 s
+    # (2 s warmup + 4 x 2 s) and the SPS30 for about 5 s - a budget in seconds turns the sensors off sooner,
+    # but the slow sensors then average fewer samples (e.g. one each with a 2 s budget)
+    SCAN_BUDGET = float(os.environ.get("SCAN_BUDGET", 0)) or None
+
+    # sensor variables - "real" drivers, "simulated" signals, or "replay" of existing data files
+    SENSOR_BACKEND = os.environ.get("SENSOR_BACKEND", "real")
+    sensor_options = {}
+    # The I2C sensors make their transactions through one bus
+    i2c = None
+    if SENSOR_BACKEND == "real":
+        i2c = I2CBus()
+        sensor_options["i2c"] = i2c
+        sensor_options["dgs_connection"] = os.environ.get("DGS_CONNECTION", "reopen")
+    if SENSOR_BACKEND in ("simulated", "replay"):
+        sensor_options["clock"] = clock
+    if SENSOR_BACKEND == "simulated":
+        if "SIM_LATENCY" in os.environ:
+            sensor_options["latency"] = float(os.environ["SIM_LATENCY"])
+        sensor_options["error_rate"] = float(os.environ.get("SIM_ERROR_RATE", 0))
+        i2c = I2CBus(FakeI2C(
+            latency=float(os.environ.get("SIM_I2C_LATENCY", 0)),
+            error_rate=float(os.environ.get("SIM_I2C_ERROR_RATE", 0)),
+        ))
+        sensor_options["i2c"] = i2c
+    elif SENSOR_BACKEND == "replay":
+        sensor_options["data_dir"] = os.environ.get("REPLAY_DIR", "/home/pi/DATA")
+        sensor_options["pattern"] = os.environ.get("REPLAY_PATTERN", "*")
 
     # Only use sensors that are available
-    for name, sens in sensor_classes.items():
+    sensors = create_sensors(SENSOR_BACKEND, **sensor_options)
+
+    # The latest row is shared with the display through memory
+    try:
+        channel = LatestReadingPublisher(os.environ.get("LATEST_READING_PATH", LATEST_READING_PATH))
+    except OSError as e:
+        log.warning(f"Could not create shared reading: {e}")
+        channel = None
+
+    # Blocking driver calls run on one worker thread per bus/port
+    scanner = Scanner(sensors, samples=5, clock=clock, budget=SCAN_BUDGET)
+    # Samples are averaged into a fixed set of columns
+    aggregator = CycleAggregator(column for sensor in sensors.values() for column in sensor.columns)
+    # The day's data file is kept open between cycles
+    flush_policy = {"flush_rows": CSV_FLUSH_ROWS, "flush_seconds": CSV_FLUSH_SECONDS, "fsync": CSV_FSYNC}
+    if STORAGE_BACKEND == "binary":
+        writer = DailyBinaryWriter(beacon, aggregator.columns, data_dir=DATA_DIR, dtype=STORAGE_DTYPE, **flush_policy)
+    else:
+        writer = DailyCsvWriter(beacon, aggregator.columns, data_dir=DATA_DIR, **flush_policy)
+
+    # Daily summary statistics are updated with every row - including rows written before a restart
+    corrections = CorrectionRegistry()
+    today = clock.now()
+    summary = SummaryAccumulator(beacon, date=today.date(), corrections=corrections)
+    if os.path.isfile(writer.path_for(today)):
         try:
-            sensor = sens()
-            sensors.update({name: sensor})
-        except Exception as e:
-            log.warning(e)
+            summary.add_rows(read_rows(writer.path_for(today)))
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read earlier data for the summary: {e}")
+
+    # The last day of rows is kept in memory with rolling statistics - created after the first row is
+    # written so NumPy is not loaded and the earlier files are not read before the first scan
+    history = None
+
+    # Uploads are made in the background and retried until they succeed - skipped without a bucket
+    uploads = None
+    shipper = None
+    if s3 is None:
+        log.info("No bucket configured - data will not be uploaded")
+    else:
+        uploads = UploadQueue(s3, BUCKET_NAME, journal=os.path.join(writer.data_dir, "uploads.journal"), codec=S3_CODEC)
+        if S3_UPLOAD_MODE == "incremental" and STORAGE_BACKEND == "binary":
+            log.warning("Incremental uploads need the csv storage backend - uploading daily")
+        elif S3_UPLOAD_MODE == "incremental":
+            shipper = IncrementalShipper(
+                uploads,
+                S3_FILEPATH,
+                chunk_dir=os.path.join(writer.data_dir, "chunks"),
+                state=os.path.join(writer.data_dir, "uploads.offsets"),
+                compact=S3_COMPACT_CHUNKS,
+            )
+        uploads.start()
+        if shipper is None:
+            queue_missed_uploads(uploads, writer, S3_FILEPATH, S3_CATCH_UP_DAYS, today)
 
     # These sensors are to turn on and off after each scan cycle to save power
-    manually_enabled_sensors = list(set(sensors) & set(["tsl", "sps", "scd"]))
+    manually_enabled_sensors = list(set(sensors) & set(MANUALLY_ENABLED))
 
-    time.sleep(1)  # Wait for all sensors to be initialized
+    if SCAN_MODE != "ready":
+        await clock.asleep(1)  # Wait for all sensors to be initialized
 
     log.info(f"Successfully created: {sensors.keys()}")
     log.info("Attempting scans")
 
-    starttime = time.time()  # Used for preventing time drift
-    while True:
-        start_time = time.time()  # Used for evaluating scan cycle time performance
-
-        # Turn on all sensors before starting scans
-        for manual_sensor in manually_enabled_sensors:
-            try:
-                sensors[manual_sensor].enable()
-            except:
-                log.warning(f"Sensor {manual_sensor} not enabled")
-
-        # Wait for sensors to come online
-        time.sleep(0.5)
-
-        data = {}
-
-        async def scan(name):
-            """Scans each sensor five times and returns the mean"""
-            df = pd.DataFrame(
-                [
-                    await sensors[name].scan(),
-                    await sensors[name].scan(),
-                    await sensors[name].scan(),
-                    await sensors[name].scan(),
-                    await sensors[name].scan(),
-                ]
-            )
-            log.info("\nScan results for " + name)
-            #log.info(df)
-            data[name] = df.mean()
-            log.info(data[name])
+    # Duration of each stage of the cycle
+    metrics = Metrics()
 
-        # Perform all scans
-        await asyncio.gather(*[scan(name) for name in sensors])
+    # Cycles start on the minute without drifting - timestamps are aligned to the minute and a minute
+    # already recorded before a restart is not written again
+    last = None
+    if os.path.isfile(writer.path_for(today)):
+        try:
+            row = LatestRowReader().read(writer.path_for(today))
+            if row is not None:
+                last = datetime.datetime.strptime(row["Timestamp"], "%Y-%m-%d %H:%M:%S").timestamp()
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read the last row: {e}")
+    scheduler = Scheduler(clock, period=CYCLE_PERIOD, catch_up=CYCLE_CATCH_UP, last=last)
+
+    cycle_times = []
+    while max_cycles is None or len(cycle_times) < max_cycles:
+        date = await scheduler.next()
+        start_time = time.perf_counter()  # Used for evaluating scan cycle time performance
 
-        # Combine all data from this cycle into one DataFrame
-        date = datetime.datetime.now()
-        timestamp = pd.Series({"Timestamp": date.strftime("%Y-%m-%d %H:%M:%S")})
-        df = pd.concat([timestamp, *data.values()]).to_frame().T.set_index("Timestamp")
-        df.sort_index(axis=1,inplace=True)
-        log.info(df)
+        # Turn on all sensors before starting scans
+        enabled_at = clock.monotonic()
+        active_start = time.perf_counter()
+        with metrics.time("enable"):
+            for manual_sensor in manually_enabled_sensors:
+                try:
+                    sensors[manual_sensor].enable()
+                except:
+                    log.warning(f"Sensor {manual_sensor} not enabled")
+                    metrics.increment("sensor_errors_total", sensor=manual_sensor, operation="enable")
+
+        if SCAN_MODE == "ready":
+            # Sample each sensor once it has warmed up and as soon as it has new data
+            with metrics.time("scan"):
+                readings = await scanner.acquire_all(start=enabled_at)
+            for name, waiting in scanner.waiting.items():
+                metrics.observe("sensor_wait", waiting, sensor=name)
+                log.info(f"{name}: {len(readings.get(name, []))} samples in {scanner.latency[name]:.2f} s ({waiting:.2f} s waiting for data)")
+        else:
+            # Wait for sensors to come online
+            with metrics.time("warmup"):
+                await clock.asleep(0.5)
+
+            # Perform all scans - each sensor is read five times on the worker for its bus
+            with metrics.time("scan"):
+                readings = await scanner.scan_all()
+
+        # Disable sensors until next measurement interval - as soon as they have been read
+        with metrics.time("disable"):
+            for manual_sensor in manually_enabled_sensors:
+                try:
+                    sensors[manual_sensor].disable()
+                except:
+                    log.warning(f"Sensor {manual_sensor} not disabled")
+                    metrics.increment("sensor_errors_total", sensor=manual_sensor, operation="disable")
+        # time the sensors were on for
+        metrics.observe("active", time.perf_counter() - active_start)
+
+        for name, latency in scanner.latency.items():
+            metrics.observe("sensor_scan", latency, sensor=name)
+        for name in sensors:
+            if not readings.get(name):
+                metrics.increment("scan_failures_total", sensor=name)
+        log.info(f"Scan latency: {scanner.latency}")
+
+        # Combine all data from this cycle into one row
+        with metrics.time("aggregate"):
+            aggregator.reset()
+            aggregator.add_readings(readings)
+            row = aggregator.means()
+        log.info(dict(zip(aggregator.columns, row)))
 
         # Write data to csv file
-        filename = f'/home/pi/DATA/b{beacon}_{date.strftime("%Y-%m-%d")}.csv'
-        try:
-            if os.path.isfile(filename):
-                df.to_csv(filename, mode="a", header=False)
+        filename = writer.path_for(date)
+        with metrics.time("write"):
+            try:
+                writer.write(date, row)
                 log.info(f"Data appended to {filename}")
-            else:
-                # create file locally
-                df.to_csv(filename)
-                log.info(f"Data written to {filename}")
-        except Exception as e:
-            log.warning(f"Could not write to file: {e}")
+            except Exception as e:
+                log.warning(f"Could not write to file: {e}")
+                metrics.increment("write_errors_total")
+
+        # Keep the row in memory - restoring the rows written before a restart on the first cycle
+        with metrics.time("history"):
+            if history is None:
+                history = History(aggregator.columns, capacity=int(86400 / CYCLE_PERIOD), period=CYCLE_PERIOD)
+                for day in (date - datetime.timedelta(days=1), date):
+                    if os.path.isfile(writer.path_for(day)):
+                        try:
+                            history.add_rows(
+                                read_rows(writer.path_for(day)),
+                                since=date.timestamp() - history.span,
+                                until=date.timestamp(),
+                            )
+                        except (OSError, ValueError) as e:
+                            log.warning(f"Could not read earlier data for the history: {e}")
+            history.append(date, row)
+
+        # Update the summary statistics
+        with metrics.time("summary"):
+            if date.date() != summary.date:
+                summary = SummaryAccumulator(beacon, date=date.date(), corrections=corrections)
+            summary.add_row(dict(zip(aggregator.columns, row)))
+
+        # Share data with the display
+        if channel is not None:
+            with metrics.time("publish"):
+                try:
+                    channel.publish(beacon, {"Timestamp": date.strftime("%Y-%m-%d %H:%M:%S"), **dict(zip(aggregator.columns, row))})
+                except ValueError as e:
+                    log.warning(f"Could not share data: {e}")
+
+        # Ship new rows to S3
+        if shipper is not None and clock.now() - S3_CHUNK_TIMESTAMP >= S3_CHUNK_FREQUENCY:
+            with metrics.time("upload"):
+                # make sure buffered rows are in the file before it is read
+                writer.flush()
+                ship_new_rows(shipper, writer, filename, S3_CATCH_UP_DAYS, date)
+            S3_CHUNK_TIMESTAMP = clock.now()
 
         # Write data to S3
-        if datetime.datetime.now() - S3_CALL_TIMESTAMP >= S3_CALL_FREQUENCY:
-            # upload raw data
-            aws_s3_upload_file(s3 = s3,
-                filename=filename,
-                s3_bucket=BUCKET_NAME,
-                s3_filepath=f"{S3_FILEPATH}data/"
-            )
-            # upload summary statistics
-            ## first generate the file
-            os.system(f"python3 /home/pi/bevo_iaq/bevobeacon-iaq/calculate_summary_stats.py {beacon}")
-            ## send to S3
-            aws_s3_upload_file(s3 = s3,
-                filename=f'/home/pi/summary_data/b{beacon}-summary-{date.strftime("%Y-%m-%d")}.json',
-                s3_bucket=BUCKET_NAME,
-                s3_filepath=f"{S3_FILEPATH}summary/"
-            )
-
-            S3_CALL_TIMESTAMP = datetime.datetime.now()
-            log.info("Data uploaded to S3")
+        if clock.now() - S3_CALL_TIMESTAMP >= S3_CALL_FREQUENCY:
+            with metrics.time("upload"):
+                # upload raw data - along with earlier days that were not uploaded in full
+                if uploads is not None and shipper is None:
+                    # make sure buffered rows are in the file before it is read
+                    writer.flush()
+                    queue_missed_uploads(uploads, writer, S3_FILEPATH, S3_CATCH_UP_DAYS, date)
+                    queue_data_upload(uploads, filename, S3_FILEPATH)
+                # upload summary statistics
+                ## first generate the file - from the running statistics, off the scan loop
+                try:
+                    summary_filename = await asyncio.get_running_loop().run_in_executor(
+                        None, lambda: save_summary(summary.result(), beacon, summary.date, SUMMARY_DIR)
+                    )
+                except OSError as e:
+                    log.warning(f"Could not save summary statistics: {e}")
+                else:
+                    ## send to S3 - only a file that was just saved
+                    if uploads is not None:
+                        uploads.put(summary_filename, f"{S3_FILEPATH}summary/{os.path.basename(summary_filename)}")
+                if uploads is not None:
+                    log.info("Data queued for upload to S3")
+
+            S3_CALL_TIMESTAMP = clock.now()
         else:
             log.info("Upload to S3 bucket delayed.")
 
-        # Disable sensors until next measurement interval
-        for manual_sensor in manually_enabled_sensors:
-            try:
-                sensors[manual_sensor].disable()
-            except:
-                log.warning(f"Sensor {manual_sensor} not disabled")
-
         # Report cycle time for performance evaluation by user
-        elapsed_time = time.time() - start_time
+        elapsed_time = time.perf_counter() - start_time
+        cycle_times.append(elapsed_time)
+        metrics.observe("cycle", elapsed_time)
+        metrics.set("cycles_late", scheduler.late)
+        metrics.set("cycles_skipped", scheduler.skipped)
+        metrics.set("clock_jumps", scheduler.jumps)
+        if uploads is not None:
+            metrics.set("uploads_pending", len(uploads.pending))
+        if i2c is not None:
+            for device, statistics in i2c.statistics().items():
+                metrics.set("i2c_transactions", statistics["transactions"], device=device)
+                metrics.set("i2c_errors", statistics["errors"], device=device)
+                metrics.set("i2c_transaction_seconds_p95", statistics["p95"], device=device)
+                metrics.set("i2c_transaction_seconds_max", statistics["max"], device=device)
         log.info(f"Cycle Time: {elapsed_time} \n\n")
 
-        # Make sure that interval between scans is exactly 60 seconds
-        time.sleep(60.0 - ((time.time() - starttime) % 60.0))
+        # Share the timings
+        if METRICS_FILE and len(cycle_times) % METRICS_INTERVAL == 0:
+            try:
+                metrics.write(METRICS_FILE)
+            except OSError as e:
+                log.warning(f"Could not write metrics: {e}")
+
+    # Only reached when a number of cycles was requested
+    writer.close()
+    scanner.shutdown()
+    for sensor in sensors.values():
+        if hasattr(sensor, "close"):
+            sensor.close()
+    if uploads is not None:
+        uploads.close()
+    if channel is not None:
+        channel.close()
+    return cycle_times
+
+def queue_data_upload(uploads, filename, s3_filepath):
+    """
+    Adds a data file to the upload queue
+
+    Parameters
+    ----------
+    uploads : UploadQueue
+        queue of files to upload
+    filename : str
+        full filepath of the local data file - binary files are uploaded as csv,
+        converted by the upload thread
+    s3_filepath : str
+        specifies the target location of the beacon's files in the bucket
+    """
+    stem, extension = os.path.splitext(os.path.basename(filename))
+    if extension == ".bin":
+        uploads.put(filename, f"{s3_filepath}data/{stem}.csv", convert="csv")
+    else:
+        uploads.put(filename, f"{s3_filepath}data/{stem}.csv")
+
+def queue_missed_uploads(uploads, writer, s3_filepath, days, today=None):
+    """
+    Adds earlier data files that were not uploaded in full (e.g. after an outage) to the upload queue
 
-def aws_s3_upload_file(s3,filename,s3_bucket,s3_filepath):
-	"""
-	Uploads locally stored file to AWS S3 bucket.
+    Parameters
+    ----------
+    uploads : UploadQueue
+        queue of files to upload
+    writer : DailyCsvWriter
+        writer of the daily data files
+    s3_filepath : str
+        specifies the target location of the beacon's files in the bucket
+    days : int
+        number of earlier days to check
+    today : datetime.datetime, default None
+        current time - the wall clock if not provided
+    """
+    today = datetime.datetime.now() if today is None else today
+    earlier = [writer.path_for(today - datetime.timedelta(days=day)) for day in range(1, days + 1)]
+    earlier = [path for path in earlier if os.path.isfile(path)]
+    key = lambda path: f"{s3_filepath}data/{os.path.splitext(os.path.basename(path))[0]}.csv"
+    for path in uploads.missing(earlier, key):
+        log.info(f"Catching up upload of {path}")
+        queue_data_upload(uploads, path, s3_filepath)
+
+def ship_new_rows(shipper, writer, filename, days, today=None):
+    """
+    Ships the rows added since the last shipment and finishes earlier days
 
     Parameters
     ----------
-	filename: str
-        full filepath of the local file
-	s3_bucket: str
-        name of the target bucket
-	s3_filepath: str
-        specifies the target location of the file in the bucket
-	
-    Returns
-    -------
-    <void>
-	"""
-	try:
-		s3_filename = s3_filepath + format(filename.split('/')[-1])
-		s3.upload_file(filename, s3_bucket, s3_filename)
-		logging.debug(filename, 'was uploaded to', s3_bucket)
-		log.info(f"{filename} was uploaded to AWS S3 bucket: {s3_bucket}")
-	except ClientError as e:
-		logging.error(e)
-		log.info(f"Could not upload to S3: {e}")
-	except FileNotFoundError as e:
-		logging.error(e)
-		log.info(f"FileNotFoundError: {e}")
+    shipper : IncrementalShipper
+        tracks the rows that have been shipped
+    writer : DailyCsvWriter
+        writer of the daily data files
+    filename : str
+        full filepath of today's data file
+    days : int
+        number of earlier days to check
+    today : datetime.datetime, default None
+        current time - the wall clock if not provided
+    """
+    today = datetime.datetime.now() if today is None else today
+    for day in range(days, 0, -1):
+        path = writer.path_for(today - datetime.timedelta(days=day))
+        try:
+            if os.path.isfile(path) and shipper.unfinished(path):
+                shipper.finish(path)
+        except OSError as e:
+            log.warning(f"Could not ship {path}: {e}")
+    try:
+        if os.path.isfile(filename):
+            shipper.ship(filename)
+    except OSError as e:
+        log.warning(f"Could not ship {filename}: {e}")
 
 def setup_logger(level=logging.WARNING):
     """
@@ -0,0 +1,160 @@
+"""Metrics
+
+This script times the stages of the scan loop (enabling sensors, scanning each
+sensor, aggregating, writing, uploading, ...) and keeps the most recent durations
+of each stage in a rolling window. The p50, p95 and max of every window are
+written periodically to a file in the Prometheus text format, which can be read
+directly or collected by the node exporter's textfile collector, so a degrading
+sensor or SD card shows up before it causes missed minutes.
+"""
+import os
+import time
+import math
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_PATH = "/dev/shm/bevobeacon-metrics.prom" if os.path.isdir("/dev/shm") else "/tmp/bevobeacon-metrics.prom"
+
+
+class RollingHistogram:
+
+    def __init__(self, window=60) -> None:
+        """
+        Parameters
+        ----------
+        window : int, default 60
+            number of recent observations the quantiles are calculated from
+
+        Creates
+        -------
+        values : deque
+            most recent observations
+        count, total : int, float
+            number and sum of all observations
+        """
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Gets the q-th quantile (0-1) of the window - NaN if empty"""
+        values = sorted(self.values)
+        if not values:
+            return math.nan
+        # nearest rank
+        return values[max(0, math.ceil(q * len(values)) - 1)]
+
+    def maximum(self):
+        return max(self.values, default=math.nan)
+
+
+class Metrics:
+
+    def __init__(self, prefix="bevobeacon", window=60) -> None:
+        """
+        Parameters
+        ----------
+        prefix : str, default "bevobeacon"
+            start of every metric name
+        window : int, default 60
+            number of recent observations kept for each stage
+
+        Creates
+        -------
+        stages : dict of RollingHistogram
+            durations indexed by stage and labels
+        counters : dict of float
+            running totals indexed by name and labels
+        gauges : dict of float
+            current values indexed by name and labels
+        """
+        self.prefix = prefix
+        self.window = window
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+
+    @staticmethod
+    def key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def observe(self, stage, seconds, **labels):
+        """Records the duration of a stage"""
+        key = self.key(stage, labels)
+        if key not in self.stages:
+            self.stages[key] = RollingHistogram(self.window)
+        self.stages[key].observe(seconds)
+
+    @contextmanager
+    def time(self, stage, **labels):
+        """Times the block inside the with statement as the given stage"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time, **labels)
+
+    def increment(self, name, value=1, **labels):
+        """Adds to a counter"""
+        key = self.key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Sets a gauge"""
+        self.gauges[self.key(name, labels)] = value
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+    def render(self):
+        """
+        Gets the metrics in the Prometheus text format
+
+        Returns
+        -------
+        text : str
+            stage durations as summaries (p50/p95/max of the window plus the
+            running sum and count) followed by the counters and gauges
+        """
+        name = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {name} Duration of the stages of the scan loop over the last {self.window} observations",
+            f"# TYPE {name} summary",
+        ]
+        for (stage, labels), histogram in sorted(self.stages.items()):
+            labels = (("stage", stage),) + labels
+            for q in (0.5, 0.95):
+                lines.append(f"{name}{self.format_labels(labels + (('quantile', q),))} {histogram.quantile(q)!r}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {histogram.total!r}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {histogram.count}")
+
+        lines += [
+            f"# HELP {name}_max Longest duration of the stages of the scan loop over the last {self.window} observations",
+            f"# TYPE {name}_max gauge",
+        ]
+        for (stage, labels), histogram in sorted(self.stages.items()):
+            lines.append(f"{name}_max{self.format_labels((('stage', stage),) + labels)} {histogram.maximum()!r}")
+
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            for metric in sorted({metric for metric, _ in values}):
+                lines.append(f"# TYPE {self.prefix}_{metric} {kind}")
+                for (other, labels), value in sorted(values.items()):
+                    if other == metric:
+                        lines.append(f"{self.prefix}_{metric}{self.format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=DEFAULT_PATH):
+        """Replaces the metrics file in one step so readers never see a partial file"""
+        temp = f"{path}.tmp"
+        with open(temp, "w") as f:
+            f.write(self.render())
+        os.replace(temp, path)
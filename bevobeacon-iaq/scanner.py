@@ -0,0 +1,219 @@
+"""Scan Engine
+
+This script runs the blocking sensor drivers on a bounded pool of worker threads
+so that sensors on separate buses are measured at the same time. Each I2C bus or
+serial port gets exactly one worker which keeps transactions on a shared bus
+serialized while the DGS serial reads overlap with the I2C traffic.
+
+Sensors can also be sampled as soon as they have data instead of after a fixed
+wait: each sensor declares how long it takes to warm up after being enabled
+(``warmup``), how often it produces a new sample (``sample_interval``), and
+optionally a quick ``data_ready`` check. The waits for every sensor run in
+parallel and the bus worker is only used for the checks and the reads.
+
+Sensors that can be read without blocking (``is_async`` with a ``read_async``
+coroutine, e.g. the DGS sensors on an async connection) are read directly on the
+event loop instead of on a worker.
+"""
+import math
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from clock import Clock
+
+log = logging.getLogger(__name__)
+
+
+class Scanner:
+
+    def __init__(self, sensors, samples=5, clock=None, budget=None, poll_interval=0.05, ready_timeout=1.0) -> None:
+        """
+        Parameters
+        ----------
+        sensors : dict
+            sensor objects indexed by name - each must provide a blocking ``read``
+            method and a ``bus`` attribute naming the bus/port it communicates on
+        samples : int, default 5
+            number of readings taken from each sensor per scan
+        clock : Clock, default None
+            time source for the waits when acquiring - the wall clock if not provided
+        budget : float, default None
+            seconds after the start of an acquisition by which sensors stop being
+            sampled (each sensor still gives at least one sample) - no limit if not provided
+        poll_interval : float, default 0.05
+            seconds between data-ready checks
+        ready_timeout : float, default 1.0
+            seconds past the sensor's expected sample time to wait for data before giving up
+
+        Creates
+        -------
+        executors : dict
+            single-worker thread pools indexed by bus
+        latency : dict
+            duration in (real) seconds of the latest scan indexed by sensor name
+        waiting : dict
+            real seconds spent waiting for data during the latest acquisition indexed by sensor name
+        """
+        self.sensors = sensors
+        self.samples = samples
+        self.clock = Clock() if clock is None else clock
+        self.budget = budget
+        self.poll_interval = poll_interval
+        self.ready_timeout = ready_timeout
+
+        self.executors = {}
+        for sensor in sensors.values():
+            bus = getattr(sensor, "bus", None)
+            if bus not in self.executors:
+                self.executors[bus] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"scan-{bus}")
+
+        self.latency = {}
+        self.waiting = {}
+
+    def sample(self, name):
+        """
+        Reads the sensor the specified number of times (blocking)
+
+        Parameters
+        ----------
+        name : str
+            sensor to read
+
+        Returns
+        -------
+        readings : list of dict
+            one dictionary of measurements per sample
+        """
+        sensor = self.sensors[name]
+        start_time = time.perf_counter()
+        readings = [sensor.read() for _ in range(self.samples)]
+        self.latency[name] = time.perf_counter() - start_time
+        return readings
+
+    async def sample_async(self, name):
+        """Reads a non-blocking sensor the specified number of times"""
+        sensor = self.sensors[name]
+        start_time = time.perf_counter()
+        readings = [await sensor.read_async() for _ in range(self.samples)]
+        self.latency[name] = time.perf_counter() - start_time
+        return readings
+
+    async def read(self, sensor, executor):
+        """Reads the sensor once - on the event loop if it can be read without blocking"""
+        if getattr(sensor, "is_async", False):
+            return await sensor.read_async()
+        return await asyncio.get_running_loop().run_in_executor(executor, sensor.read)
+
+    async def scan(self, name):
+        """Samples the sensor on the worker assigned to its bus"""
+        loop = asyncio.get_running_loop()
+        executor = self.executors[getattr(self.sensors[name], "bus", None)]
+        try:
+            if getattr(self.sensors[name], "is_async", False):
+                return await self.sample_async(name)
+            return await loop.run_in_executor(executor, self.sample, name)
+        except Exception as e:
+            log.warning(f"Scan failed for {name}: {e}")
+            return []
+
+    async def scan_all(self):
+        """
+        Samples every sensor concurrently
+
+        Returns
+        -------
+        readings : dict of list
+            samples from each sensor indexed by sensor name
+        """
+        names = list(self.sensors)
+        results = await asyncio.gather(*[self.scan(name) for name in names])
+        return dict(zip(names, results))
+
+    async def acquire(self, name, start):
+        """
+        Samples the sensor as soon as it has data
+
+        Parameters
+        ----------
+        name : str
+            sensor to read
+        start : float
+            monotonic clock time at which the sensor was enabled
+
+        Returns
+        -------
+        readings : list of dict
+            one dictionary of measurements per sample
+        """
+        sensor = self.sensors[name]
+        executor = self.executors[getattr(sensor, "bus", None)]
+        warmup = getattr(sensor, "warmup", 0)
+        interval = getattr(sensor, "sample_interval", 0)
+        data_ready = getattr(sensor, "data_ready", None)
+        stop = start + self.budget if self.budget is not None else math.inf
+
+        readings = []
+        waiting = 0.0
+        ready = True
+        start_time = time.perf_counter()
+        try:
+            await self.clock.asleep(start + warmup - self.clock.monotonic())
+            while ready and len(readings) < self.samples:
+                if data_ready is not None:
+                    wait_start = self.clock.monotonic()
+                    wait_start_time = time.perf_counter()
+                    ready = await self.wait_for_data(executor, data_ready, wait_start + interval + self.ready_timeout)
+                    waiting += time.perf_counter() - wait_start_time
+                    if not ready:
+                        log.warning(f"{name} had no new data after {self.clock.monotonic() - wait_start:.2f} s")
+                        if readings:
+                            break
+                        # read anyway - the driver has its own (limited) wait for data
+                elif readings and interval:
+                    await self.clock.asleep(interval)
+
+                readings.append(await self.read(sensor, executor))
+                if self.clock.monotonic() + interval > stop:
+                    break
+        except Exception as e:
+            log.warning(f"Acquisition failed for {name}: {e}")
+
+        # timings are in real seconds like the other metrics, whatever the clock
+        self.latency[name] = time.perf_counter() - start_time
+        self.waiting[name] = waiting
+        return readings
+
+    async def wait_for_data(self, executor, data_ready, timeout):
+        """Polls the data-ready check on the bus worker until it passes or the (monotonic) timeout"""
+        loop = asyncio.get_running_loop()
+        while not await loop.run_in_executor(executor, data_ready):
+            if self.clock.monotonic() >= timeout:
+                return False
+            await self.clock.asleep(self.poll_interval)
+        return True
+
+    async def acquire_all(self, start=None):
+        """
+        Samples every sensor as soon as it has data - the waits run concurrently
+
+        Parameters
+        ----------
+        start : float, default None
+            monotonic clock time at which the sensors were enabled - now if not provided
+
+        Returns
+        -------
+        readings : dict of list
+            samples from each sensor indexed by sensor name
+        """
+        start = self.clock.monotonic() if start is None else start
+        names = list(self.sensors)
+        results = await asyncio.gather(*[self.acquire(name, start) for name in names])
+        return dict(zip(names, results))
+
+    def shutdown(self):
+        """Stops the worker threads"""
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
@@ -0,0 +1,118 @@
+"""Cycle Scheduler
+
+This script paces the measurement loop. Cycles are scheduled on the monotonic
+clock so NTP corrections after boot cannot stretch or shorten the wait, and the
+wait is awaited so the event loop keeps running in between. Every cycle gets a
+timestamp aligned to the period (e.g. 12:01:00 for one-minute cycles) that
+follows the wall clock, including any jumps.
+
+Cycles that start late are counted, and when a cycle overruns by more than a
+whole period the missed cycles are either skipped or, up to a limit, run back to
+back to catch up.
+"""
+import math
+import logging
+import datetime
+
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+
+    def __init__(self, clock, period=60.0, catch_up=0, tolerance=None, last=None) -> None:
+        """
+        Parameters
+        ----------
+        clock : Clock
+            provides the wall and monotonic time and the waits
+        period : float, default 60.0
+            seconds between the start of consecutive cycles
+        catch_up : int, default 0
+            number of missed cycles that are still run (immediately, one after
+            another) when the loop falls behind - any others are skipped
+        tolerance : float, default None
+            seconds a cycle can start late without being counted, and the largest
+            difference between the wall and monotonic clocks treated as drift rather
+            than a jump - a tenth of the period (at most 1 s) if not provided
+        last : float, default None
+            time in seconds since the epoch of the last cycle that was recorded, e.g.
+            before a restart - if it is the period the first cycle falls in, the first
+            cycle waits for the next period instead of repeating its timestamp
+
+        Creates
+        -------
+        cycles : int
+            number of cycles started
+        late : int
+            cycles that started more than the tolerance after their scheduled time
+        skipped : int
+            cycles that were not run because the loop fell too far behind
+        jumps : int
+            number of wall-clock jumps that moved the timestamps
+        """
+        self.clock = clock
+        self.period = period
+        self.catch_up = catch_up
+        self.tolerance = min(1.0, period / 10) if tolerance is None else tolerance
+        self.last = last
+
+        self.deadline = None
+        self.slot = None
+        self.cycles = 0
+        self.late = 0
+        self.skipped = 0
+        self.jumps = 0
+
+    def align(self, wall):
+        """Gets the start of the period the wall time falls in"""
+        return math.floor((wall + self.tolerance) / self.period) * self.period
+
+    async def next(self):
+        """
+        Waits for the start of the next cycle
+
+        Returns
+        -------
+        timestamp : datetime.datetime
+            local time of the cycle aligned to the period
+        """
+        now = self.clock.monotonic()
+        if self.deadline is None:
+            # the first cycle starts right away - the following ones on the period boundaries
+            wall = self.clock.time()
+            self.slot = self.align(wall)
+            if self.last is not None and self.slot <= self.last < self.slot + self.period:
+                log.info("This period was recorded before a restart - waiting for the next one")
+                self.slot += self.period
+            self.deadline = now + (self.slot - wall)
+            if self.deadline > now:
+                await self.clock.asleep(self.deadline - now)
+        else:
+            behind = now - self.deadline
+            missed = math.floor(behind / self.period)
+            if missed > self.catch_up:
+                skip = missed - self.catch_up
+                self.skipped += skip
+                self.deadline += skip * self.period
+                self.slot += skip * self.period
+                log.warning(f"Skipped {skip} cycle(s) after falling {behind:.1f} s behind")
+
+            if self.deadline > now:
+                await self.clock.asleep(self.deadline - now)
+                now = self.clock.monotonic()
+            elif now - self.deadline > self.tolerance:
+                self.late += 1
+
+            # the wall clock should show the slot plus however late this cycle is
+            wall = self.clock.time()
+            expected = self.slot + (now - self.deadline)
+            if abs(wall - expected) > self.tolerance:
+                self.jumps += 1
+                self.slot = self.align(wall - (now - self.deadline))
+                log.warning(f"Wall clock moved by {wall - expected:+.1f} s")
+
+        timestamp = datetime.datetime.fromtimestamp(self.slot)
+        self.cycles += 1
+        self.deadline += self.period
+        self.slot += self.period
+        return timestamp
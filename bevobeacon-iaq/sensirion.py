@@ -1,10 +1,13 @@
 """Sensirion Sensors
 
 This script handles data measurements from the Sensirion SCD30 and SPS30 sensors.
+Their transactions go through the shared I2C bus.
 """
 import time
-import asyncio
-import numpy as np
+import math
+
+from i2c_bus import I2CBus
+from sensor_specs import SENSORS, TIMING
 
 # pip packages
 from scd30_i2c import SCD30 as Sensirion_SCD30
@@ -12,20 +15,27 @@ from sps30 import SPS30 as Sensirion_SPS30
 
 
 class SPS30:
-    def __init__(self) -> None:
-        sps = Sensirion_SPS30(1)
+    bus, columns = SENSORS["sps"]
+    warmup, sample_interval = TIMING["sps"]
+
+    def __init__(self, i2c=None) -> None:
+        self.i2c = I2CBus() if i2c is None else i2c
+        sps = self.i2c.transaction("sps", Sensirion_SPS30, 1)
         self.sps = sps
 
     def enable(self):
-        self.sps.start_measurement()
+        self.i2c.transaction("sps", self.sps.start_measurement)
 
     def disable(self):
-        self.sps.stop_measurement()
+        self.i2c.transaction("sps", self.sps.stop_measurement)
 
     def clean(self):
-        self.sps.start_fan_cleaning()
+        self.i2c.transaction("sps", self.sps.start_fan_cleaning)
 
-    async def scan(self):
+    def data_ready(self):
+        return bool(self.i2c.transaction("sps", self.sps.read_data_ready_flag))
+
+    def read(self):
         """
         Measures different particulate matter counts and concentrations in the
         room. Data are stored locally.
@@ -36,25 +46,25 @@ class SPS30:
         try:
             # Wait until data ready flag is shown but limit retries so it doesn't block forever
             attempts = 0
-            while (not sps.read_data_ready_flag()) and attempts <= 3:
-                await asyncio.sleep(0.1)
+            while (not self.data_ready()) and attempts <= 3:
+                time.sleep(0.1)
                 attempts += 1
 
             # Read data
-            sps.read_measured_values()
+            self.i2c.transaction("sps", sps.read_measured_values)
             pm = sps.dict_values
         except Exception as e:
             # error reading from sensors
             pm = {
-                "nc0p5": np.nan,
-                "nc1p0": np.nan,
-                "nc2p5": np.nan,
-                "nc4p0": np.nan,
-                "nc10p0": np.nan,
-                "pm1p0": np.nan,
-                "pm2p5": np.nan,
-                "pm4p0": np.nan,
-                "pm10p0": np.nan,
+                "nc0p5": math.nan,
+                "nc1p0": math.nan,
+                "nc2p5": math.nan,
+                "nc4p0": math.nan,
+                "nc10p0": math.nan,
+                "pm1p0": math.nan,
+                "pm2p5": math.nan,
+                "pm4p0": math.nan,
+                "pm10p0": math.nan,
             }
 
         return {
@@ -69,19 +79,29 @@ class SPS30:
             "pm10_mass-microgram_per_m3": pm["pm10p0"],
         }
 
+    async def scan(self):
+        return self.read()
+
 
 class SCD30:
-    def __init__(self) -> None:
-        scd30 = Sensirion_SCD30()
+    bus, columns = SENSORS["scd"]
+    warmup, sample_interval = TIMING["scd"]
+
+    def __init__(self, i2c=None) -> None:
+        self.i2c = I2CBus() if i2c is None else i2c
+        scd30 = self.i2c.transaction("scd", Sensirion_SCD30)
         self.scd30 = scd30
 
     def enable(self):
-        self.scd30.start_periodic_measurement()
+        self.i2c.transaction("scd", self.scd30.start_periodic_measurement)
 
     def disable(self):
-        self.scd30.stop_periodic_measurement()
+        self.i2c.transaction("scd", self.scd30.stop_periodic_measurement)
 
-    async def scan(self):
+    def data_ready(self):
+        return bool(self.i2c.transaction("scd", self.scd30.get_data_ready))
+
+    def read(self):
         """
         Measures the carbon dioxide concentration, temperature, and relative
         humidity in the room. Returns a dictionary containing the carbon dioxide concentration in ppm,
@@ -93,15 +113,18 @@ class SCD30:
 
             # Wait until data ready flag is shown but limit retries so it doesn't block forever
             attempts = 0
-            while (not scd30.get_data_ready()) and (attempts <= 3):
-                await asyncio.sleep(0.1)
+            while (not self.data_ready()) and (attempts <= 3):
+                time.sleep(0.1)
                 attempts += 1
 
             # Read data
-            co2, tc, rh = scd30.read_measurement()
+            co2, tc, rh = self.i2c.transaction("scd", scd30.read_measurement)
         except:
-            co2 = np.nan
-            tc = np.nan
-            rh = np.nan
+            co2 = math.nan
+            tc = math.nan
+            rh = math.nan
 
         return {"carbon_dioxide-ppm": co2, "t_from_co2-c": tc, "rh_from_co2-percent": rh}
+
+    async def scan(self):
+        return self.read()
@@ -0,0 +1,42 @@
+"""Sensor Specifications
+
+This script describes the beacon's sensors without importing any hardware
+libraries: the bus each one communicates on, the columns of its readings, and
+how soon it has data. The drivers and the sensor backends both take these values
+from here so they cannot drift apart.
+"""
+
+# bus (the default serial port of the DGS sensors) and output columns of each sensor
+SENSORS = {
+    "sgp": ("i2c", ("total_volatile_organic_compounds-ppb", "equivalent_carbon_dioxide-ppm")),
+    "tsl": ("i2c", ("visible-unitless", "infrared-unitless", "light-lux")),
+    "sps": ("i2c", (
+        "pm0p5_count-number_per_cm3",
+        "pm1_count-number_per_cm3",
+        "pm2p5_count-number_per_cm3",
+        "pm4_count-number_per_cm3",
+        "pm10_count-number_per_cm3",
+        "pm1_mass-microgram_per_m3",
+        "pm2p5_mass-microgram_per_m3",
+        "pm4_mass-microgram_per_m3",
+        "pm10_mass-microgram_per_m3",
+    )),
+    "scd": ("i2c", ("carbon_dioxide-ppm", "t_from_co2-c", "rh_from_co2-percent")),
+    "dgs_co": ("/dev/ttyUSB1", ("carbon_monoxide-ppb", "t_from_co-c", "rh_from_co-percent")),
+    "dgs_no2": ("/dev/ttyUSB0", ("nitrogen_dioxide-ppb", "t_from_no2-c", "rh_from_no2-percent")),
+}
+
+# warmup after being enabled and interval between new samples of each sensor in seconds
+TIMING = {
+    # always on and measured on request
+    "sgp": (0.0, 0.0),
+    # one integration (101 ms) after being enabled before the first valid reading
+    "tsl": (0.12, 0.0),
+    # new measurements every second once started
+    "sps": (1.0, 1.0),
+    # continuous measurements every 2 seconds (the default interval) once started
+    "scd": (2.0, 2.0),
+    # measured on request
+    "dgs_co": (0.0, 0.0),
+    "dgs_no2": (0.0, 0.0),
+}
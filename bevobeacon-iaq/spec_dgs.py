@@ -2,24 +2,90 @@
 
 This script handles data measurements from the CO and NO2 Digital Gas Sensors
 made by SPEC.
+
+By default the serial port is opened and closed around every measurement. With
+a persistent connection the port is opened once, stale input is flushed before
+each request, and the response is read up to its line terminator instead of
+after a fixed wait. A pipelined connection additionally sends the next request
+as soon as a response has been read so the sensor measures while the previous
+sample is being processed. If the sensor is unplugged, the port is reopened on
+a later measurement once it is back.
+
+An async connection reads the port from the event loop instead of a worker
+thread: the port is non-blocking, incoming bytes are parsed into records as they
+arrive, and every request is answered through a future, so a hung sensor only
+delays its own readings.
+
+A stream connection puts the sensor in continuous output instead. Every record
+it sends is kept with its arrival time in a ring buffer, and a reading is the
+average of the records received over the last window, so scans no longer wait
+for the sensor at all.
 """
 
-import numpy as np
+import time
+import math
 import serial
 import asyncio
+import logging
+from collections import deque
+
+from sensor_specs import SENSORS, TIMING
+
+log = logging.getLogger(__name__)
+
+CONNECTIONS = ("reopen", "persistent", "pipelined", "async", "stream")
+
+# command that starts the continuous output of the DGS (about one record per second)
+STREAM_COMMAND = b"c"
 
 
 class DGS:
-    def __init__(self, port) -> None:
+
+    def __init__(self, port, connection="reopen", max_age=1.0, window=60.0, buffer_size=600, stale_after=5.0) -> None:
         """
         Create and config the Serial object for connecting to the spec
         dgs sensors
+
+        Parameters
+        ----------
+        port : str
+            device the sensor is connected to
+        connection : str, default "reopen"
+            "reopen" to open and close the port for every measurement, "persistent"
+            to keep it open, "pipelined" to keep it open and request the next
+            measurement right after reading one, "async" to read it from the
+            event loop with ``read_async``, or "stream" to read the continuous
+            output from the event loop
+        max_age : float, default 1.0
+            seconds after which the response to a pipelined request is considered
+            stale and is discarded
+        window : float, default 60.0
+            seconds of streamed records averaged into one reading
+        buffer_size : int, default 600
+            number of streamed records kept
+        stale_after : float, default 5.0
+            seconds without a streamed record after which the continuous output
+            is requested again
         """
+        if connection not in CONNECTIONS:
+            raise ValueError(f"Unknown DGS connection: {connection} (available: {', '.join(CONNECTIONS)})")
         ser = serial.Serial()
         ser.port = port
         ser.timeout = 1
         ser.write_timeout = 1
         self.ser = ser
+        self.bus = port
+        self.connection = connection
+        self.max_age = max_age
+        self.requested_at = None
+        self.lost = False
+        self.reconnects = 0
+        self.transport = None
+
+        self.window = window
+        self.stale_after = stale_after
+        self.records = deque(maxlen=buffer_size)
+        self.waiter = None
 
     @staticmethod
     def split(data):
@@ -39,7 +105,7 @@ class DGS:
         }
         return output
 
-    async def take_measurement(self, verbose=False):
+    def take_measurement(self, verbose=False):
         """
         Uses the device string to read data from the serial DGS sensors
         Parameters
@@ -67,7 +133,7 @@ class DGS:
             ser.write(b"\r")
             ser.write(b"\r")  # Repeat to make sure the sensor recieves it
 
-            await asyncio.sleep(0.1)  # Wait for response
+            time.sleep(0.1)  # Wait for response
 
             # Read and decode data
             line = str(ser.readline(), "utf-8")
@@ -79,48 +145,379 @@ class DGS:
             rh = data["rh"]
 
         except:
-            c = np.nan
-            tc = np.nan
-            rh = np.nan
+            c = math.nan
+            tc = math.nan
+            rh = math.nan
 
         # Close connection (also clears queue) and return relevant data
         ser.close()
         return float(c), float(tc), float(rh)
 
+    def request(self):
+        """Asks the sensor for one measurement"""
+        self.ser.write(b"\r")
+        self.requested_at = time.monotonic()
+
+    def read_line(self):
+        """
+        Reads one response from the open port
+
+        Returns
+        -------
+        line : str
+            response without the line terminator - empty if the sensor did not
+            respond within the port's timeout
+        """
+        line = self.ser.read_until(b"\n")
+        if not line.endswith(b"\n"):
+            return ""
+        return str(line, "utf-8").rstrip("\r\n")
+
+    def take_measurement_persistent(self):
+        """
+        Reads data from the serial DGS sensors over a connection that stays open
+
+        Returns
+        -------
+        c: float
+            concentration in ppb
+        tc: float
+            temperature in degress C
+        rh: float
+            relative humidity in percent
+        """
+        ser = self.ser
+        try:
+            if not ser.is_open:
+                ser.open()
+                self.requested_at = None
+                if self.lost:
+                    log.info(f"Reconnected to {self.bus}")
+                    self.lost = False
+                    self.reconnects += 1
+
+            pending = self.requested_at is not None and time.monotonic() - self.requested_at < self.max_age
+            if not pending:
+                # drop responses to earlier requests so only a fresh one is read
+                ser.reset_input_buffer()
+                self.request()
+            line = self.read_line()
+            if not line:
+                # repeat in case the sensor missed the request
+                self.request()
+                line = self.read_line()
+            self.requested_at = None
+            if self.connection == "pipelined":
+                self.request()
+        except Exception as e:
+            # e.g. the sensor was unplugged (serial, OS, or termios errors) - reopen
+            # the port on a later measurement
+            if not self.lost:
+                log.warning(f"Lost connection to {self.bus}: {e}")
+                self.lost = True
+            self.close()
+            return math.nan, math.nan, math.nan
+
+        try:
+            data = DGS.split(line.split(", "))
+            return float(data["ppb"]), float(data["temp"]), float(data["rh"])
+        except (ValueError, IndexError):
+            return math.nan, math.nan, math.nan
+
+    def measure(self):
+        """Takes one measurement with the configured connection"""
+        if self.connection == "reopen":
+            return self.take_measurement()
+        elif self.connection == "stream":
+            return self.windowed(time.monotonic())
+        return self.take_measurement_persistent()
+
+    @property
+    def is_async(self):
+        """Whether the sensor is read with ``read_async`` on the event loop"""
+        return self.connection in ("async", "stream")
+
+    def record_received(self, timestamp, record):
+        """Adds a streamed record to the ring buffer"""
+        try:
+            self.records.append((timestamp, float(record["ppb"]), float(record["temp"]), float(record["rh"])))
+        except ValueError:
+            return
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def windowed(self, now):
+        """
+        Averages the streamed records
+
+        Parameters
+        ----------
+        now : float
+            current monotonic time - the end of the window
+
+        Returns
+        -------
+        c, tc, rh : float
+            mean concentration, temperature, and relative humidity of the records
+            received over the window - NaN if there are none
+        """
+        start = now - self.window
+        values = [record[1:] for record in self.records if record[0] >= start]
+        if not values:
+            return math.nan, math.nan, math.nan
+        return tuple(sum(column) / len(values) for column in zip(*values))
+
+    async def measure_stream(self):
+        """Gets the average of the streamed records, starting the stream if it is not running"""
+        now = time.monotonic()
+        if not self.transport.is_open or not self.records or now - self.records[-1][0] > self.stale_after:
+            # the port was (re)opened or the sensor stopped streaming, e.g. after a power cycle
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                self.transport.write(STREAM_COMMAND)
+                await asyncio.wait_for(self.waiter, self.transport.timeout)
+            except Exception as e:
+                log.debug(f"No streamed records from {self.bus}: {e!r}")
+            now = time.monotonic()
+        return self.windowed(now)
+
+    async def measure_async(self):
+        """Takes one measurement over the event loop's connection to the port"""
+        if self.transport is None:
+            on_record = self.record_received if self.connection == "stream" else None
+            self.transport = DGSTransport(self.bus, timeout=self.ser.timeout, max_age=self.max_age, on_record=on_record)
+        if self.connection == "stream":
+            return await self.measure_stream()
+        try:
+            data = await self.transport.request()
+            return float(data["ppb"]), float(data["temp"]), float(data["rh"])
+        except Exception as e:
+            log.debug(f"No measurement from {self.bus}: {e!r}")
+            return math.nan, math.nan, math.nan
+
+    def close(self):
+        """Closes the port if it is open"""
+        self.requested_at = None
+        if self.transport is not None:
+            self.transport.close()
+        try:
+            self.ser.close()
+        except (serial.SerialException, OSError):
+            pass
+
+
+class DGSTransport:
+
+    def __init__(self, port, timeout=1.0, max_age=1.0, on_record=None) -> None:
+        """
+        Non-blocking connection to a DGS sensor served by the running event loop
+
+        Parameters
+        ----------
+        port : str
+            device the sensor is connected to
+        timeout : float, default 1.0
+            seconds to wait for the response to a request
+        max_age : float, default 1.0
+            seconds after which an unanswered request is given up on, so a late
+            response is not taken as the answer to a newer request
+        on_record : callable, default None
+            called with the arrival time (monotonic clock) and the record of every
+            line received - requested or not
+
+        Creates
+        -------
+        pending : deque
+            unanswered requests as (time sent, future) in the order they were sent
+        reconnects : int
+            number of times the port was reopened after losing the connection
+        """
+        self.port = port
+        self.timeout = timeout
+        self.max_age = max_age
+        self.on_record = on_record
+        self.ser = None
+        self.loop = None
+        self.buffer = b""
+        self.pending = deque()
+        self.lost = False
+        self.reconnects = 0
+
+    @property
+    def is_open(self):
+        return self.ser is not None
+
+    def open(self):
+        """Opens the port without blocking and starts watching it for data"""
+        self.loop = asyncio.get_running_loop()
+        self.ser = serial.Serial(self.port, timeout=0, write_timeout=0)
+        self.buffer = b""
+        self.loop.add_reader(self.ser.fileno(), self.data_received)
+        if self.lost:
+            log.info(f"Reconnected to {self.port}")
+            self.lost = False
+            self.reconnects += 1
+
+    def close(self):
+        """Stops watching the port, closes it, and fails the unanswered requests"""
+        self.connection_lost(None)
+
+    def data_received(self):
+        """Reads whatever is waiting on the port and handles every complete line"""
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except Exception as e:
+            # e.g. the sensor was unplugged - reopen the port on a later request
+            self.connection_lost(e)
+            return
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            self.line_received(str(line, "utf-8", errors="replace").rstrip("\r"))
+
+    def line_received(self, line):
+        """Parses a record and answers the oldest unanswered request with it"""
+        try:
+            record = DGS.split(line.split(", "))
+        except IndexError:
+            record = None
+        if record is not None and self.on_record is not None:
+            self.on_record(time.monotonic(), record)
+        if self.pending:
+            _, future = self.pending.popleft()
+            if not future.done():
+                if record is None:
+                    future.set_exception(ValueError(f"Malformed record from {self.port}: {line!r}"))
+                else:
+                    future.set_result(record)
+
+    def connection_lost(self, exc):
+        if self.ser is None:
+            return
+        if exc is not None and not self.lost:
+            log.warning(f"Lost connection to {self.port}: {exc}")
+            self.lost = True
+        try:
+            self.loop.remove_reader(self.ser.fileno())
+        except Exception:
+            pass
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+        self.ser = None
+        while self.pending:
+            _, future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(exc or serial.SerialException(f"{self.port} closed"))
+
+    def write(self, command):
+        """Writes a command, opening the port if needed"""
+        if not self.is_open:
+            self.open()
+        try:
+            self.ser.write(command)
+        except Exception as e:
+            self.connection_lost(e)
+            raise
+
+    def send(self, command=b"\r"):
+        """Writes a command and registers a future for its response"""
+        if not self.is_open:
+            self.open()
+        now = self.loop.time()
+        # requests that were never answered do not get to claim later responses
+        while self.pending and (self.pending[0][1].done() or now - self.pending[0][0] > self.max_age):
+            self.pending.popleft()
+        future = self.loop.create_future()
+        self.pending.append((now, future))
+        try:
+            self.ser.write(command)
+        except Exception as e:
+            self.connection_lost(e)
+        return future
+
+    async def request(self):
+        """
+        Asks the sensor for one measurement
+
+        Returns
+        -------
+        record : dict
+            measurement labelled by ``DGS.split``
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            if the sensor does not respond to the request or to one repeat of it
+        """
+        try:
+            return await asyncio.wait_for(self.send(), self.timeout)
+        except asyncio.TimeoutError:
+            # repeat in case the sensor missed the request
+            return await asyncio.wait_for(self.send(), self.timeout)
+
 
 class DGS_NO2(DGS):
-    def __init__(self) -> None:
-        super().__init__("/dev/ttyUSB0")
+    columns = SENSORS["dgs_no2"][1]
+    warmup, sample_interval = TIMING["dgs_no2"]
 
-    async def scan(self):
+    def __init__(self, port=SENSORS["dgs_no2"][0], **kwargs) -> None:
+        super().__init__(port, **kwargs)
+
+    def read(self):
         """
         Using serial connection, reads in values for T, RH, and NO2 concentration
         """
         try:
-            no2, t0, rh0 = await self.take_measurement()
+            no2, t0, rh0 = self.measure()
         except:
-            no2 = np.nan
-            t0 = np.nan
-            rh0 = np.nan
+            no2 = math.nan
+            t0 = math.nan
+            rh0 = math.nan
 
         data = {"nitrogen_dioxide-ppb": no2, "t_from_no2-c": t0, "rh_from_no2-percent": rh0}
         return data
 
+    async def read_async(self):
+        """Reads T, RH, and NO2 concentration without blocking the event loop"""
+        no2, t0, rh0 = await self.measure_async()
+        return {"nitrogen_dioxide-ppb": no2, "t_from_no2-c": t0, "rh_from_no2-percent": rh0}
+
+    async def scan(self):
+        if self.is_async:
+            return await self.read_async()
+        return self.read()
+
 
 class DGS_CO(DGS):
-    def __init__(self) -> None:
-        super().__init__("/dev/ttyUSB1")
+    columns = SENSORS["dgs_co"][1]
+    warmup, sample_interval = TIMING["dgs_co"]
 
-    async def scan(self):
+    def __init__(self, port=SENSORS["dgs_co"][0], **kwargs) -> None:
+        super().__init__(port, **kwargs)
+
+    def read(self):
         """
         Using serial connection, reads in values for T, RH, and CO concentration
         """
         try:
-            co, t1, rh1 = await self.take_measurement()
+            co, t1, rh1 = self.measure()
         except:
-            co = np.nan
-            t1 = np.nan
-            rh1 = np.nan
+            co = math.nan
+            t1 = math.nan
+            rh1 = math.nan
 
         data = {"carbon_monoxide-ppb": co, "t_from_co-c": t1, "rh_from_co-percent": rh1}
         return data
+
+    async def read_async(self):
+        """Reads T, RH, and CO concentration without blocking the event loop"""
+        co, t1, rh1 = await self.measure_async()
+        return {"carbon_monoxide-ppb": co, "t_from_co-c": t1, "rh_from_co-percent": rh1}
+
+    async def scan(self):
+        if self.is_async:
+            return await self.read_async()
+        return self.read()
+
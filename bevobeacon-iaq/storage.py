@@ -0,0 +1,435 @@
+"""Storage
+
+This script handles writing the cycle measurements to the daily data files on the
+device. The file for the current day is kept open between cycles and is replaced
+by the next day's file at midnight.
+
+Two formats are available: the CSV files used since the first beacons, and a
+compact binary format holding one fixed-width record per row behind a small
+header with the column names. Binary files can be memory-mapped into NumPy
+arrays and converted back to the CSV format.
+"""
+import os
+import csv
+import json
+import time
+import struct
+import logging
+import datetime
+
+log = logging.getLogger(__name__)
+
+
+def format_value(value):
+    """Formats a measurement the same way pandas writes it - NaN is left blank"""
+    if value != value:
+        return ""
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class DailyCsvWriter:
+
+    extension = "csv"
+
+    def __init__(self, beacon, columns, data_dir="/home/pi/DATA", flush_rows=1, flush_seconds=None, fsync=False) -> None:
+        """
+        Parameters
+        ----------
+        beacon : str
+            number assigned to the beacon
+        columns : list of str
+            measurement names in the order they are written
+        data_dir : str, default "/home/pi/DATA"
+            location of the daily data files
+        flush_rows : int or None, default 1
+            flush after this many rows have been written - None to disable
+        flush_seconds : float or None, default None
+            flush when this many seconds have passed since the last flush - None to disable
+        fsync : boolean, default False
+            whether each flush also forces the data onto the SD card
+
+        Creates
+        -------
+        path : str
+            location of the file currently open
+        """
+        self.beacon = beacon
+        self.columns = list(columns)
+        self.data_dir = data_dir
+
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.fsync = fsync
+
+        self.path = None
+        self.file = None
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def path_for(self, date):
+        """Gets the location of the data file for the given date"""
+        return os.path.join(self.data_dir, f"b{self.beacon}_{date.strftime('%Y-%m-%d')}.{self.extension}")
+
+    def header(self):
+        """Gets the first line of a new data file"""
+        return ",".join(["Timestamp", *self.columns]) + "\n"
+
+    def format(self, timestamp, values):
+        """Gets the line written for a single row"""
+        return ",".join([timestamp, *map(format_value, values)]) + "\n"
+
+    def encode(self, date, values):
+        """Gets what is written to the file for a single row"""
+        return self.format(date.strftime("%Y-%m-%d %H:%M:%S"), values)
+
+    def open(self, path):
+        """Opens the file for appending and adds the header to new files"""
+        self.close()
+        self.file = open(path, "a", newline="")
+        self.path = path
+        if self.file.tell() == 0:
+            self.file.write(self.header())
+            log.info(f"Data written to {path}")
+
+    def write(self, date, values):
+        """
+        Appends a row to the file for the given date
+
+        Parameters
+        ----------
+        date : datetime.datetime
+            time of the measurements
+        values : list of float
+            measurements in column order
+
+        Returns
+        -------
+        path : str
+            location of the file the row was written to
+        """
+        path = self.path_for(date)
+        if path != self.path:
+            # first write or midnight rollover
+            self.open(path)
+
+        self.file.write(self.encode(date, values))
+        self.pending += 1
+
+        if self.flush_rows and self.pending >= self.flush_rows:
+            self.flush()
+        elif self.flush_seconds and time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+        return path
+
+    def flush(self):
+        """Pushes buffered rows to the file (and to the SD card if fsync is set)"""
+        if self.file is None:
+            return
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Flushes and closes the current file"""
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+        self.path = None
+
+
+# Binary format
+# -------------
+# header: MAGIC | uint32 length of the JSON description | JSON description (padded to 8 bytes)
+# records: int64 timestamp (seconds since 1970-01-01 of the local time) | one value per column
+MAGIC = b"BEVOBIN1"
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def binary_header(columns, dtype="<f8"):
+    """Gets the header bytes for a binary data file"""
+    description = json.dumps({"columns": list(columns), "dtype": dtype}).encode("utf-8")
+    length = len(MAGIC) + 4 + len(description)
+    description += b" " * (-length % 8)
+    return MAGIC + struct.pack("<I", len(description)) + description
+
+
+def read_binary_header(f):
+    """
+    Reads the header of a binary data file
+
+    Parameters
+    ----------
+    f : file object
+        binary file positioned at the start
+
+    Returns
+    -------
+    columns : list of str
+        measurement names in the order they are stored
+    dtype : str
+        NumPy type string of the stored measurements
+    offset : int
+        number of bytes before the first record
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a BEVO binary data file")
+    length, = struct.unpack("<I", f.read(4))
+    description = json.loads(f.read(length).decode("utf-8"))
+    return description["columns"], description["dtype"], len(MAGIC) + 4 + length
+
+
+class DailyBinaryWriter(DailyCsvWriter):
+
+    extension = "bin"
+
+    def __init__(self, beacon, columns, data_dir="/home/pi/DATA", dtype="<f8", **kwargs) -> None:
+        """
+        Parameters
+        ----------
+        beacon : str
+            number assigned to the beacon
+        columns : list of str
+            measurement names in the order they are written
+        data_dir : str, default "/home/pi/DATA"
+            location of the daily data files
+        dtype : str, default "<f8"
+            "<f8" stores the measurements exactly, "<f4" halves the file size but
+            rounds the values to single precision
+        **kwargs
+            flush policy passed to DailyCsvWriter
+        """
+        super().__init__(beacon, columns, data_dir=data_dir, **kwargs)
+        self.dtype = dtype
+        self.order = None
+        self.record = None
+
+    def open(self, path):
+        """Opens the file for appending and adds the header to new files"""
+        self.close()
+        self.file = open(path, "ab")
+        self.path = path
+        if self.file.tell() == 0:
+            self.file.write(binary_header(self.columns, self.dtype))
+            file_columns, dtype = self.columns, self.dtype
+            log.info(f"Data written to {path}")
+        else:
+            # keep the layout of the existing file (e.g. after a restart with a different set of sensors)
+            with open(path, "rb") as f:
+                file_columns, dtype, _ = read_binary_header(f)
+
+        index = {column: i for i, column in enumerate(self.columns)}
+        self.order = [index.get(column) for column in file_columns]
+        self.record = struct.Struct("<q" + {"<f8": "d", "<f4": "f"}[dtype] * len(file_columns))
+
+    def encode(self, date, values):
+        """Gets the bytes written for a single row"""
+        nan = float("nan")
+        return self.record.pack(
+            int((date.replace(microsecond=0) - EPOCH).total_seconds()),
+            *[nan if i is None else values[i] for i in self.order],
+        )
+
+
+def read_binary(path):
+    """
+    Memory-maps a binary data file
+
+    Parameters
+    ----------
+    path : str
+        location of the binary data file
+
+    Returns
+    -------
+    records : numpy structured array
+        read-only records with a "timestamp" field (seconds since 1970-01-01 of
+        the local time) and one field per measurement
+    """
+    import numpy as np
+
+    with open(path, "rb") as f:
+        columns, dtype, offset = read_binary_header(f)
+    record = np.dtype([("timestamp", "<i8"), *[(column, dtype) for column in columns]])
+
+    # ignore a partially written record at the end of the file
+    n = (os.path.getsize(path) - offset) // record.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=record)
+    return np.memmap(path, dtype=record, mode="r", offset=offset, shape=(n,))
+
+
+def binary_to_csv(path, csv_path=None):
+    """
+    Converts a binary data file to the CSV format written by DailyCsvWriter
+
+    Parameters
+    ----------
+    path : str
+        location of the binary data file
+    csv_path : str, default None
+        location of the CSV file - defaults to the binary file's location with a
+        .csv extension
+
+    Returns
+    -------
+    csv_path : str
+        location of the CSV file
+    """
+    if csv_path is None:
+        csv_path = os.path.splitext(path)[0] + ".csv"
+
+    records = read_binary(path)
+    columns = list(records.dtype.names[1:])
+    writer = DailyCsvWriter(None, columns)
+    with open(csv_path, "w", newline="") as f:
+        f.write(writer.header())
+        for record in records.tolist():
+            timestamp = EPOCH + datetime.timedelta(seconds=record[0])
+            f.write(writer.format(timestamp.strftime("%Y-%m-%d %H:%M:%S"), record[1:]))
+
+    return csv_path
+
+
+def read_rows(path):
+    """
+    Reads the rows of a csv or binary data file
+
+    Parameters
+    ----------
+    path : str
+        location of the data file
+
+    Returns
+    -------
+    rows : generator of dict
+        measurements indexed by column name with the time under "Timestamp"
+    """
+    if path.endswith(".bin"):
+        records = read_binary(path)
+        columns = records.dtype.names[1:]
+        for record in records.tolist():
+            row = {"Timestamp": (EPOCH + datetime.timedelta(seconds=record[0])).strftime("%Y-%m-%d %H:%M:%S")}
+            row.update(zip(columns, record[1:]))
+            yield row
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        for values in reader:
+            row = {"Timestamp": values[0]}
+            for column, value in zip(columns[1:], values[1:]):
+                row[column] = float(value) if value else float("nan")
+            yield row
+
+
+class LatestRowReader:
+
+    def __init__(self, block_size=4096) -> None:
+        """
+        Reads the most recent row of the data files without parsing the whole file
+
+        Parameters
+        ----------
+        block_size : int, default 4096
+            number of bytes read at a time when searching backwards for the last line
+
+        Creates
+        -------
+        cache : dict
+            latest row of each file indexed by path along with the header and the
+            inode/size/mtime used to tell whether the file has changed
+        """
+        self.block_size = block_size
+        self.cache = {}
+
+    def read(self, path):
+        """
+        Gets the latest row of a data file
+
+        Parameters
+        ----------
+        path : str
+            location of a csv or binary data file
+
+        Returns
+        -------
+        row : dict or None
+            measurements indexed by column name with the time under "Timestamp",
+            None if the file has no rows yet
+        """
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+        cached = self.cache.get(path)
+        if cached is not None and cached["inode"] == stat.st_ino and cached["version"] == version:
+            return cached["row"]
+
+        with open(path, "rb") as f:
+            if cached is not None and cached["inode"] == stat.st_ino:
+                header = cached["header"]
+            else:
+                header = self.read_header(path, f)
+
+            if path.endswith(".bin"):
+                row = self.read_last_record(f, header, stat.st_size)
+            else:
+                row = self.read_last_line(f, header, stat.st_size)
+
+        self.cache[path] = {"inode": stat.st_ino, "version": version, "header": header, "row": row}
+        return row
+
+    @staticmethod
+    def read_header(path, f):
+        """Gets the column names and the size of the header"""
+        if path.endswith(".bin"):
+            columns, dtype, offset = read_binary_header(f)
+            record = struct.Struct("<q" + {"<f8": "d", "<f4": "f"}[dtype] * len(columns))
+            return {"columns": columns, "offset": offset, "record": record}
+
+        line = f.readline()
+        columns = line.decode("utf-8-sig").rstrip("\r\n").split(",")
+        return {"columns": columns, "offset": len(line), "record": None}
+
+    def read_last_line(self, f, header, size):
+        """Searches backwards from the end of the file for the last complete line"""
+        start = header["offset"]
+        buffer = b""
+        position = size
+        while position > start:
+            step = min(self.block_size, position - start)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+
+            stop = buffer.rfind(b"\n")
+            if stop == -1:
+                continue
+            begin = buffer.rfind(b"\n", 0, stop)
+            if begin != -1 or position == start:
+                values = buffer[begin + 1:stop].decode("utf-8").rstrip("\r").split(",")
+                row = {"Timestamp": values[0]}
+                for column, value in zip(header["columns"][1:], values[1:]):
+                    row[column] = float(value) if value else float("nan")
+                return row
+
+        return None
+
+    @staticmethod
+    def read_last_record(f, header, size):
+        """Reads the last complete record of a binary file"""
+        record = header["record"]
+        n = (size - header["offset"]) // record.size
+        if n == 0:
+            return None
+        f.seek(header["offset"] + (n - 1) * record.size)
+        values = record.unpack(f.read(record.size))
+
+        timestamp = EPOCH + datetime.timedelta(seconds=values[0])
+        row = {"Timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")}
+        row.update(zip(header["columns"], values[1:]))
+        return row
@@ -0,0 +1,272 @@
+"""Streaming Summary Statistics
+
+This script keeps the daily summary statistics up to date as rows are written so
+the summary does not need to be recalculated from the day's data file. The min,
+max, mean and time above threshold are kept as running values and the median is
+calculated exactly from a sorted buffer of the day's values (1440 per parameter).
+Accumulators can be merged for weekly/monthly rollups.
+"""
+import json
+import math
+import heapq
+import bisect
+
+# thresholds used for the time above threshold - matches Calculate.get_statistics
+DEFAULT_THRESHOLDS = {"co2":1100,"pm2p5_mass":12,"co":4,"temperature_c":27,"rh":60}
+
+# raw data column of each summarized parameter
+RAW_COLUMNS = {
+    "co2": "carbon_dioxide-ppm",
+    "pm2p5_mass": "pm2p5_mass-microgram_per_m3",
+    "co": "carbon_monoxide-ppb",
+    "temperature_c": "t_from_no2-c",
+    "rh": "rh_from_no2-percent",
+}
+
+
+def get_pollutant_units(pollutant):
+    """Gets the formated label for the pollutant"""
+    if pollutant == "co2":
+        return "ppm"
+    elif pollutant == "co":
+        return "ppb"
+    elif pollutant == "pm2p5_mass":
+        return "microgram_per_m3"
+    elif pollutant == "pm2p5_number":
+        return "#/cm3"
+    elif pollutant == "no2":
+        return "ppb"
+    elif pollutant == "tvoc":
+        return "ppb"
+    elif pollutant == "temperature_c":
+        return "c"
+    elif pollutant == "rh":
+        return "percent"
+    elif pollutant in ["lux","light"]:
+        return "lux"
+    else:
+        return ""
+
+
+def get_pollutant_name(pollutant):
+    """Gets a more formal representation of the pollutant"""
+    if pollutant == "co2":
+        return "carbon_dioxide"
+    elif pollutant == "co":
+        return "carbon_monoxide"
+    elif pollutant == "pm2p5_mass":
+        return "pm2p5_mass"
+    elif pollutant == "pm2p5_number":
+        return "pm2p5_number"
+    elif pollutant == "no2":
+        return "nitrogen_dioxide"
+    elif pollutant == "tvoc":
+        return "total_volatile_organic_compounds"
+    elif pollutant == "temperature_c":
+        return "temperature"
+    elif pollutant == "rh":
+        return "relative_humidity"
+    elif pollutant in ["lux","light"]:
+        return "light"
+    else:
+        return ""
+
+
+def save_summary(res, beacon, date, save_dir="/home/pi/summary_data/"):
+    """
+    Saves summary statistics as a json file
+
+    Parameters
+    ----------
+    res : dict of dict
+        summary statistics indexed by pollutant
+    beacon : str
+        number assigned to the beacon
+    date : datetime.date
+        day that was summarized
+    save_dir : str, default "/home/pi/summary_data/"
+        location of the summary files
+
+    Returns
+    -------
+    save_path : str
+        location of the saved file
+    """
+    save_path = f"{save_dir}b{beacon}-summary-{date.strftime('%Y-%m-%d')}.json"
+    with open(save_path, 'w') as f:
+        json.dump(res, f,indent=4)
+    return save_path
+
+
+class PollutantAccumulator:
+
+    def __init__(self, threshold) -> None:
+        """
+        Parameters
+        ----------
+        threshold : float
+            values above the threshold count towards the time above threshold
+        """
+        self.threshold = threshold
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.above = 0
+        self.values = []
+
+    def add(self, value):
+        """Adds one measurement - NaN is skipped"""
+        if value != value:
+            return
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        if value > self.threshold:
+            self.above += 1
+        bisect.insort(self.values, value)
+
+    def add_many(self, values):
+        """Adds several measurements"""
+        for value in values:
+            self.add(float(value))
+
+    def merge(self, other):
+        """Adds the measurements of another accumulator"""
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.above += other.above
+        self.values = list(heapq.merge(self.values, other.values))
+
+    def median(self):
+        n = len(self.values)
+        if n == 0:
+            return math.nan
+        if n % 2:
+            return self.values[n // 2]
+        return (self.values[n // 2 - 1] + self.values[n // 2]) / 2
+
+    def result(self):
+        """
+        Gets the summary statistics
+
+        Returns
+        -------
+        res : dict
+            min, mean, median and max (negative/no-detect values reported as 0)
+            and the number of minutes above the threshold
+        """
+        res = {}
+        if self.count == 0:
+            stats = [math.nan] * 4
+        else:
+            stats = [self.minimum, self.total / self.count, self.median(), self.maximum]
+        for stat_str, value in zip(["min","mean","median","max"], stats):
+            # correcting negative (no detect) values
+            if value < 0:
+                value = 0
+            res[stat_str] = value
+        res["time_above_threshold"] = self.above # this assumes a 1-minute resolution on the data
+        return res
+
+
+class SummaryAccumulator:
+
+    def __init__(self, beacon, date=None, thresholds=DEFAULT_THRESHOLDS, corrections=None) -> None:
+        """
+        Parameters
+        ----------
+        beacon : str
+            number assigned to the beacon
+        date : datetime.date, default None
+            day being summarized
+        thresholds : dict, default DEFAULT_THRESHOLDS
+            threshold of each summarized parameter
+        corrections : CorrectionRegistry, default None
+            correction models applied to raw rows - raw rows are not corrected if not provided
+
+        Creates
+        -------
+        stats : dict of PollutantAccumulator
+            accumulators indexed by parameter
+        """
+        self.beacon = beacon
+        self.date = date
+        self.corrections = corrections
+        self.stats = {param: PollutantAccumulator(threshold) for param, threshold in thresholds.items()}
+
+    def add(self, values):
+        """
+        Adds corrected measurements
+
+        Parameters
+        ----------
+        values : dict
+            corrected measurement of each parameter
+        """
+        for param, value in values.items():
+            if param in self.stats:
+                self.stats[param].add(value)
+
+    def add_row(self, row):
+        """
+        Corrects and adds a row of raw data
+
+        Parameters
+        ----------
+        row : dict
+            raw measurements indexed by column name
+        """
+        values = {}
+        for param in self.stats:
+            try:
+                value = float(row[RAW_COLUMNS.get(param, param)])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if self.corrections is not None:
+                value = float(self.corrections.apply(param, value, self.beacon))
+            if param == "co":
+                value /= 1000
+            values[param] = value
+        self.add(values)
+
+    def add_rows(self, rows):
+        """Corrects and adds several rows of raw data"""
+        for row in rows:
+            self.add_row(row)
+
+    def merge(self, other):
+        """
+        Adds the measurements of another accumulator (e.g. the next day for a weekly summary)
+
+        Returns
+        -------
+        self : SummaryAccumulator
+        """
+        for param, stats in other.stats.items():
+            if param in self.stats:
+                self.stats[param].merge(stats)
+            else:
+                self.stats[param] = stats
+        return self
+
+    def result(self):
+        """
+        Gets the summary statistics in the format of Calculate.get_statistics
+
+        Returns
+        -------
+        res : dict of dict
+            dictionary indexed by pollutant containing dictionaries with summary statistics
+        """
+        res = {}
+        for param, stats in self.stats.items():
+            iaq_res = {"unit": get_pollutant_units(param)}
+            iaq_res.update(stats.result())
+            res[get_pollutant_name(param)] = iaq_res
+        return res
@@ -0,0 +1,590 @@
+"""Upload Queue
+
+This script uploads files to the S3 bucket from a background thread so a slow or
+missing network connection does not hold up the measurements. Pending uploads are
+recorded in a journal on disk and are retried with exponential backoff (with
+jitter) until they succeed, including after a restart. The journal also records
+what has been uploaded so days missed during an outage can be caught up.
+
+Data can also be shipped during the day: only the rows added since the last
+shipment are uploaded, as small compressed chunk objects, and the chunks can be
+replaced by the full day's file once the day is over.
+
+The S3 client is only created (and boto3 only imported) when the first upload is
+made, and is then reused so its connections are kept alive between uploads.
+
+Uploads can be compressed with gzip, lzma (xz) or zstd (if the zstandard package
+is installed). Files are compressed in a streaming fashion just before they are
+sent and the codec is stored as the object's Content-Encoding.
+"""
+import os
+import gzip
+import lzma
+import json
+import random
+import shutil
+import logging
+import tempfile
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+# file extension of each codec
+CODECS = {"gzip": ".gz", "lzma": ".xz", "zstd": ".zst"}
+
+
+def open_compressed(filename, codec, level=None):
+    """
+    Opens a file for writing compressed data
+
+    Parameters
+    ----------
+    filename : str
+        location of the compressed file
+    codec : str
+        "gzip", "lzma", or "zstd"
+    level : int, default None
+        compression level - the codec's default if not provided
+
+    Returns
+    -------
+    f : file object
+        binary file that compresses what is written to it
+    """
+    if codec == "gzip":
+        return gzip.open(filename, "wb", compresslevel=9 if level is None else level)
+    elif codec == "lzma":
+        return lzma.open(filename, "wb", preset=level)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return compressor.stream_writer(open(filename, "wb"), closefd=True)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def compress_file(filename, codec, compressed=None, level=None, chunk_size=65536):
+    """
+    Compresses a file without reading it into memory all at once
+
+    Parameters
+    ----------
+    filename : str
+        location of the file
+    codec : str
+        "gzip", "lzma", or "zstd"
+    compressed : str, default None
+        location of the compressed file - a temporary file if not provided
+    level : int, default None
+        compression level - the codec's default if not provided
+    chunk_size : int, default 65536
+        number of bytes compressed at a time
+
+    Returns
+    -------
+    compressed : str
+        location of the compressed file
+    """
+    if compressed is None:
+        fd, compressed = tempfile.mkstemp(suffix=CODECS.get(codec, ""))
+        os.close(fd)
+    with open(filename, "rb") as src, open_compressed(compressed, codec, level) as dst:
+        shutil.copyfileobj(src, dst, chunk_size)
+    return compressed
+
+
+class S3Client:
+
+    def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, max_pool_connections=2) -> None:
+        """
+        Stand-in for the boto3 S3 client that creates it on first use
+
+        Parameters
+        ----------
+        aws_access_key_id, aws_secret_access_key : str, default None
+            credentials - boto3 looks for them in its usual places if not provided
+        max_pool_connections : int, default 2
+            number of connections kept open for reuse
+
+        Creates
+        -------
+        client : boto3 S3 client or None
+            the client once the first request has been made
+        """
+        self.aws_access_key_id = aws_access_key_id or None
+        self.aws_secret_access_key = aws_secret_access_key or None
+        self.max_pool_connections = max_pool_connections
+
+        self.client = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Gets the client - importing boto3 and creating the client the first time"""
+        with self.lock:
+            if self.client is None:
+                import boto3
+                from botocore.config import Config
+
+                session = boto3.session.Session(
+                    aws_access_key_id=self.aws_access_key_id,
+                    aws_secret_access_key=self.aws_secret_access_key,
+                )
+                self.client = session.client(
+                    "s3",
+                    config=Config(max_pool_connections=self.max_pool_connections, tcp_keepalive=True),
+                )
+                log.info("Created S3 client")
+            return self.client
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None):
+        self.connect().upload_file(filename, bucket, key, ExtraArgs=ExtraArgs)
+
+    def delete_object(self, Bucket, Key):
+        self.connect().delete_object(Bucket=Bucket, Key=Key)
+
+
+class UploadQueue:
+
+    def __init__(self, client, bucket, journal="/home/pi/DATA/uploads.journal",
+                 base_delay=5, max_delay=3600, sleep=None, codec=None) -> None:
+        """
+        Parameters
+        ----------
+        client : S3 client
+            object providing ``upload_file(filename, bucket, key)``
+        bucket : str
+            name of the target bucket
+        journal : str, default "/home/pi/DATA/uploads.journal"
+            location of the journal of pending and completed uploads
+        base_delay : float, default 5
+            seconds before the first retry - doubles with every failed attempt
+        max_delay : float, default 3600
+            longest wait between attempts in seconds
+        sleep : callable, default None
+            waits for the given number of seconds or until the queue is closed -
+            replaceable for testing
+        codec : str, default None
+            "gzip", "lzma", or "zstd" to compress uploads - None to upload files as they are
+
+        Creates
+        -------
+        pending : dict
+            uploads waiting to be made indexed by bucket key
+        uploaded : dict
+            size of the source file at the time of the last successful upload
+            indexed by bucket key - not kept for temporary files (``delete=True``)
+        listeners : list of callable
+            called with the journal entry of each completed upload
+        """
+        self.client = client
+        self.bucket = bucket
+        self.journal = journal
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.codec = codec
+
+        self.pending = {}
+        self.uploaded = {}
+        self.attempts = {}
+        self.listeners = []
+
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.stopped = threading.Event()
+        self.sleep = sleep if sleep is not None else self.stopped.wait
+        self.thread = None
+
+        self.replay()
+
+    def replay(self):
+        """Restores pending and completed uploads from the journal"""
+        if not os.path.isfile(self.journal):
+            return
+        with open(self.journal) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # partially written line from a power cut
+                    continue
+                if entry["op"] == "add":
+                    self.pending[entry["key"]] = entry
+                elif entry["op"] == "done":
+                    self.pending.pop(entry["key"], None)
+                    if "size" in entry:
+                        self.uploaded[entry["key"]] = entry["size"]
+                elif entry["op"] == "drop":
+                    self.pending.pop(entry["key"], None)
+        # rewrite the journal without the completed entries
+        self.compact()
+        if self.pending:
+            log.info(f"Resuming {len(self.pending)} pending uploads")
+
+    def record(self, entry):
+        """Appends an entry to the journal (lock must be held)"""
+        with open(self.journal, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Rewrites the journal with only the current state"""
+        temp = f"{self.journal}.tmp"
+        with open(temp, "w") as f:
+            for key, size in self.uploaded.items():
+                f.write(json.dumps({"op": "done", "key": key, "size": size}) + "\n")
+            for entry in self.pending.values():
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.journal)
+
+    def put(self, filename, key, source=None, **extra):
+        """
+        Adds a file to the queue - replaces a pending upload to the same key
+
+        Parameters
+        ----------
+        filename : str
+            location of the local file
+        key : str
+            target location of the file in the bucket
+        source : str, default None
+            file the upload was made from (e.g. a binary data file converted to csv)
+            whose size is recorded once uploaded - defaults to filename
+        **extra
+            additional values stored with the entry - ``delete=True`` removes the
+            local file once it has been uploaded, ``encoding=<codec>`` marks a
+            file that is already compressed, ``codec=<codec>`` compresses the
+            file with another codec than the queue's, and ``convert="csv"`` uploads
+            a binary data file as csv, converted just before each attempt
+        """
+        source = filename if source is None else source
+        try:
+            size = os.path.getsize(source)
+        except OSError:
+            size = None
+        entry = {"op": "add", "key": key, "filename": filename, "size": size, **extra}
+        with self.lock:
+            self.record(entry)
+            self.pending[key] = entry
+            self.attempts.pop(key, None)
+            self.ready.notify()
+
+    def missing(self, paths, key):
+        """
+        Finds files that were never uploaded or have changed since they were
+
+        Parameters
+        ----------
+        paths : list of str
+            local files to check
+        key : callable
+            gives the bucket key for a local file
+
+        Returns
+        -------
+        missing : list of str
+            files that need to be uploaded
+        """
+        with self.lock:
+            return [
+                path for path in paths
+                if key(path) not in self.pending and self.uploaded.get(key(path)) != os.path.getsize(path)
+            ]
+
+    def delay(self, attempt):
+        """Gets the wait before the given retry - exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def forget(self, prefix):
+        """Drops the completed uploads whose keys start with prefix, e.g. of objects that were deleted"""
+        with self.lock:
+            keys = [key for key in self.uploaded if key.startswith(prefix)]
+            for key in keys:
+                del self.uploaded[key]
+            if keys:
+                self.compact()
+
+    def upload(self, entry):
+        """
+        Makes a single upload attempt - converting a binary data file to csv and
+        compressing the file first if needed
+        """
+        filename = entry["filename"]
+        converted = None
+        if entry.get("convert") == "csv":
+            from storage import binary_to_csv
+
+            fd, converted = tempfile.mkstemp(suffix=".csv")
+            os.close(fd)
+        try:
+            if converted is not None:
+                filename = binary_to_csv(filename, converted)
+
+            encoding = entry.get("encoding")
+            codec = entry.get("codec", self.codec)
+            if encoding is not None or codec is None:
+                extra_args = {"ContentEncoding": encoding} if encoding else None
+                self.client.upload_file(filename, self.bucket, entry["key"], ExtraArgs=extra_args)
+                return
+
+            compressed = compress_file(filename, codec)
+            try:
+                self.client.upload_file(compressed, self.bucket, entry["key"], ExtraArgs={"ContentEncoding": codec})
+            finally:
+                os.remove(compressed)
+        finally:
+            # the converted copy is only kept for the attempt
+            if converted is not None:
+                os.remove(converted)
+
+    def run(self):
+        """Uploads pending files until the queue is closed"""
+        while not self.stopped.is_set():
+            with self.lock:
+                while not self.pending and not self.stopped.is_set():
+                    self.ready.wait()
+                if self.stopped.is_set():
+                    break
+                key, entry = next(iter(self.pending.items()))
+
+            try:
+                self.upload(entry)
+            except (FileNotFoundError, ValueError) as e:
+                # a missing file or a binary file that cannot be converted will not upload on a retry
+                log.warning(f"Dropping upload of {entry['filename']}: {e}")
+                with self.lock:
+                    if self.pending.get(key) is entry:
+                        del self.pending[key]
+                        self.record({"op": "drop", "key": key})
+                continue
+            except Exception as e:
+                with self.lock:
+                    attempt = self.attempts.get(key, 0)
+                    self.attempts[key] = attempt + 1
+                    # move to the back of the queue so other files are not held up
+                    if self.pending.get(key) is entry:
+                        del self.pending[key]
+                        self.pending[key] = entry
+                wait = self.delay(attempt)
+                log.warning(f"Could not upload {entry['filename']} to S3 (attempt {attempt + 1}), retrying in {wait:.0f} s: {e}")
+                self.sleep(wait)
+                continue
+
+            with self.lock:
+                # a newer version of the file may have been queued during the upload
+                current = self.pending.get(key) is entry
+                if current:
+                    del self.pending[key]
+                    self.attempts.pop(key, None)
+                    if entry.get("delete"):
+                        # temporary files (e.g. chunks) are never checked again
+                        self.record({"op": "done", "key": key})
+                    else:
+                        self.uploaded[key] = entry["size"]
+                        self.record({"op": "done", "key": key, "size": entry["size"]})
+            log.info(f"{entry['filename']} was uploaded to AWS S3 bucket: {self.bucket}")
+
+            if not current:
+                continue
+            if entry.get("delete"):
+                try:
+                    os.remove(entry["filename"])
+                except OSError:
+                    pass
+            for listener in self.listeners:
+                try:
+                    listener(entry)
+                except Exception as e:
+                    log.warning(f"Upload listener failed for {key}: {e}")
+
+    def start(self):
+        """Starts the background upload thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="upload", daemon=True)
+            self.thread.start()
+
+    def close(self, timeout=None):
+        """Stops the background upload thread - pending uploads stay in the journal"""
+        self.stopped.set()
+        with self.lock:
+            self.ready.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+
+class IncrementalShipper:
+
+    def __init__(self, uploads, s3_filepath, chunk_dir="/home/pi/DATA/chunks",
+                 state="/home/pi/DATA/uploads.offsets", compact=True) -> None:
+        """
+        Parameters
+        ----------
+        uploads : UploadQueue
+            queue the chunks are uploaded through
+        s3_filepath : str
+            specifies the target location of the beacon's files in the bucket
+        chunk_dir : str, default "/home/pi/DATA/chunks"
+            location of the compressed chunks waiting to be uploaded
+        state : str, default "/home/pi/DATA/uploads.offsets"
+            location of the file holding the acknowledged offset of each data file
+        compact : boolean, default True
+            whether a finished day's chunks are replaced by the full file - which
+            is compressed with the same codec as the chunks
+
+        Creates
+        -------
+        acked : dict
+            number of bytes of each data file that reached the bucket
+        queued : dict
+            number of bytes of each data file that have been queued
+        chunks : dict of list
+            bucket keys of the uploaded chunks of each data file
+        """
+        self.uploads = uploads
+        self.s3_filepath = s3_filepath
+        self.chunk_dir = chunk_dir
+        self.state = state
+        self.compact = compact
+        os.makedirs(chunk_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.acked = {}
+        self.chunks = {}
+        self.finished = set()
+        if os.path.isfile(state):
+            with open(state) as f:
+                saved = json.load(f)
+            self.acked = saved.get("acked", {})
+            self.chunks = saved.get("chunks", {})
+            self.finished = set(saved.get("finished", []))
+
+        # chunks in the upload journal have been queued but not acknowledged
+        self.queued = dict(self.acked)
+        for entry in uploads.pending.values():
+            if "chunk_of" in entry:
+                name = entry["chunk_of"]
+                self.queued[name] = max(self.queued.get(name, 0), entry["end"])
+        # chunks are tracked here - older journals also listed every uploaded chunk
+        uploads.forget(f"{s3_filepath}chunks/")
+
+        uploads.listeners.append(self.acknowledge)
+
+    def save(self):
+        """Writes the acknowledged offsets to the state file (lock must be held)"""
+        temp = f"{self.state}.tmp"
+        with open(temp, "w") as f:
+            json.dump({"acked": self.acked, "chunks": self.chunks, "finished": sorted(self.finished)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.state)
+
+    def data_key(self, path):
+        """Gets the bucket key of the full data file"""
+        return f"{self.s3_filepath}data/{os.path.basename(path)}"
+
+    def ship(self, path):
+        """
+        Queues the rows added to a csv data file since the last shipment
+
+        Parameters
+        ----------
+        path : str
+            location of the data file
+
+        Returns
+        -------
+        key : str or None
+            bucket key of the chunk, None if there were no new complete rows
+        """
+        name = os.path.basename(path)
+        start = self.queued.get(name, 0)
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        # only ship complete rows
+        length = data.rfind(b"\n") + 1
+        if length == 0:
+            return None
+        end = start + length
+
+        stem = os.path.splitext(name)[0]
+        codec = self.uploads.codec or "gzip"
+        key = f"{self.s3_filepath}chunks/{stem}/{start:012d}-{end:012d}.csv{CODECS[codec]}"
+        chunk = os.path.join(self.chunk_dir, f"{stem}-{start:012d}.csv{CODECS[codec]}")
+        with open_compressed(chunk, codec) as f:
+            f.write(data[:length])
+
+        self.uploads.put(chunk, key, delete=True, encoding=codec, chunk_of=name, start=start, end=end)
+        self.queued[name] = end
+        return key
+
+    def unfinished(self, path):
+        """Whether a data file still has rows to ship or chunks to compact"""
+        with self.lock:
+            return os.path.basename(path) not in self.finished
+
+    def finish(self, path):
+        """
+        Ships the remaining rows of a day's data file and, if compacting, queues
+        the full file to replace the chunks
+
+        Parameters
+        ----------
+        path : str
+            location of the data file
+        """
+        name = os.path.basename(path)
+        self.ship(path)
+        if self.compact:
+            # queued once - putting it again every interval would reset its backoff and grow the journal
+            key = self.data_key(path)
+            with self.uploads.lock:
+                queued = key in self.uploads.pending
+            if not queued:
+                self.uploads.put(path, key, compacts=name, codec=self.uploads.codec or "gzip")
+            return
+        with self.lock:
+            if self.acked.get(name) == os.path.getsize(path):
+                self.mark_finished(name)
+                self.save()
+
+    def acknowledge(self, entry):
+        """Records a completed upload (called from the upload thread)"""
+        with self.lock:
+            if "chunk_of" in entry:
+                name = entry["chunk_of"]
+                self.chunks.setdefault(name, []).append(entry["key"])
+                if name in self.finished:
+                    # the full file has already replaced the chunks
+                    self.delete_chunks(name)
+                else:
+                    self.acked[name] = max(self.acked.get(name, 0), entry["end"])
+                self.save()
+            elif "compacts" in entry:
+                self.mark_finished(entry["compacts"])
+                self.save()
+
+    def mark_finished(self, name):
+        """Stops tracking a data file whose rows have all reached the bucket (lock must be held)"""
+        self.finished.add(name)
+        self.acked.pop(name, None)
+        if self.compact:
+            self.delete_chunks(name)
+        else:
+            self.chunks.pop(name, None)
+
+    def delete_chunks(self, name):
+        """Removes the chunk objects of a data file from the bucket"""
+        for key in self.chunks.pop(name, []):
+            try:
+                self.uploads.client.delete_object(Bucket=self.uploads.bucket, Key=key)
+            except Exception as e:
+                log.warning(f"Could not delete chunk {key}: {e}")